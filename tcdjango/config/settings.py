@@ -217,11 +217,140 @@ REPROJECTION_METHOD: str = 'linear'
 
 RESAMPLING_METHOD: str = 'average'
 
-#: Size of raster file in-memory cache in bytes
+#: Size of raster file in-memory cache in bytes (shared by all views and threads of a worker)
 RASTER_CACHE_SIZE: int = 1024 * 1024 * 490  # 490 MB
 
-#: Compression level of raster file in-memory cache, from 0-9
-RASTER_CACHE_COMPRESS_LEVEL: int = 9
+#: Eviction policy of the raster file in-memory cache: 'lru', 'lfu', 'lfu-aging' (decaying
+#: frequencies) or 'tinylfu' (W-TinyLFU admission filter). Run `manage.py replay_cache_log`
+#: on a recorded tile access log (logger 'server.tile_access') to compare.
+RASTER_CACHE_POLICY: str = 'lfu'
+
+#: Number of independently locked shards of the raster file in-memory cache
+RASTER_CACHE_SHARDS: int = 16
+
+#: Compression codec of raster file caches: 'none', 'zlib', 'lz4' (needs lz4),
+#: 'zstd' (needs zstandard). Run `manage.py benchmark_cache` to compare.
+RASTER_CACHE_CODEC: str = 'zlib'
+
+#: Compression level of raster file caches (codec dependent, 0-9 for zlib)
+RASTER_CACHE_COMPRESS_LEVEL: int = 1
+
+#: Byte-shuffle multi-byte raster data before compression (usually better ratios)
+RASTER_CACHE_SHUFFLE: bool = False
+
+#: Maximum number of finished tile reads waiting to be written to the tile caches, further
+#: reads are not cached while the cache writer is behind
+RASTER_CACHE_WRITE_QUEUE: int = 256
+
+#: Eviction priority of the raster file in-memory cache under CACHE_MEMORY_BUDGET
+#: (caches with lower priority are evicted first)
+RASTER_CACHE_PRIORITY: int = 10
+
+#: Maximum number of idle raster file handles kept open per process for reuse
+#: (0 to open and close the file for every tile)
+RASTER_HANDLE_POOL_SIZE: int = 32
+
+#: Where tile reads run, 'process' (pool of worker processes) or 'thread' (thread pool in
+#: the serving process; GDAL releases the GIL while reading and results are not pickled)
+RASTER_EXECUTOR: str = 'process'
+
+#: Number of tile worker processes or threads
+RASTER_EXECUTOR_WORKERS: int = 3
+
+#: Replace worker processes after this many tile reads per worker, None to keep them
+RASTER_WORKER_MAX_TASKS: Optional[int] = None
+
+#: Replace worker processes once one of them used more than this many bytes of memory
+RASTER_WORKER_MAX_MEMORY: Optional[int] = None
+
+#: GDAL configuration options set once in every tile worker, e.g. {'GDAL_CACHEMAX': 256}
+RASTER_WORKER_GDAL_CONFIG: Dict[str, Any] = {}
+
+#: Tiles of at least this many bytes are handed from worker processes to the server
+#: through shared memory instead of being pickled (None to always pickle)
+RASTER_SHARED_MEMORY_THRESHOLD: Optional[int] = 256 * 1024
+
+#: Read rasters that are already in Web Mercator (EPSG:3857) through a plain windowed read
+#: instead of a WarpedVRT (see optimize_rasters --reproject)
+RASTER_DIRECT_READ: bool = True
+
+#: Read XYZ tiles in aligned blocks of N x N tiles with a single warp and cache all of them
+#: (1 to read every tile on its own)
+RASTER_METATILE_SIZE: int = 1
+
+#: After a tile cache miss, read neighbouring tiles within this many tiles into the cache
+#: (0 to disable prefetching)
+RASTER_PREFETCH_RADIUS: int = 0
+
+#: Also prefetch the four children of a missed tile
+RASTER_PREFETCH_CHILDREN: bool = True
+
+#: Drop prefetches while at least this many tile reads are in flight
+RASTER_PREFETCH_MAX_PENDING: int = 3
+
+#: Collect cache misses for the same raster file for this many seconds and read them in one
+#: task with a single dataset handle (None to submit every read on its own)
+RASTER_BATCH_WINDOW: Optional[float] = None
+
+#: Submit a batch of reads early once it holds this many tiles
+RASTER_BATCH_MAX_SIZE: int = 16
+
+#: Tiles up to this zoom level are overviews, scheduled after tiles of higher zoom levels
+OVERVIEW_MAX_ZOOM: int = 6
+
+#: Seconds a tile read may wait for a worker before it is dropped, by priority class
+#: (None to wait indefinitely, e.g. 10 for interactive and overview, 30 for thumbnail and
+#: 2 for prefetch); clients of dropped reads get 503 Service Unavailable
+TILE_DEADLINES: Dict[str, Optional[float]] = {
+    'interactive': None,
+    'overview': None,
+    'thumbnail': None,
+    'prefetch': None,
+}
+
+#: Seconds clients are asked to wait (Retry-After) before requesting an unavailable tile again
+RETRY_AFTER: int = 1
+
+#: Refuse new tile reads while this many reads wait for a worker (None for no limit,
+#: e.g. 64)
+SHED_QUEUE_DEPTH: Optional[int] = None
+
+#: Refuse new tile reads while the oldest queued read has waited this many seconds
+#: (None for no limit, e.g. 2.)
+SHED_QUEUE_LATENCY: Optional[float] = None
+
+#: Answer refused tiles with a cached tile up to this many zoom levels lower, scaled up
+#: (0 to always answer 503 Service Unavailable)
+SHED_DEGRADE_LEVELS: int = 3
+
+#: Maximum number of tiles (datasets times tiles) served by one batch request
+BATCH_MAX_TILES: int = 256
+
+#: Highest zoom level of tiles requested in batches
+BATCH_MAX_ZOOM: int = 30
+
+#: Maximum number of tiles in the coverage index built for each dataset at ingestion
+#: (empty tiles inside the dataset bounds are answered from it without reading the raster)
+COVERAGE_INDEX_MAX_TILES: int = 65536
+
+#: Path of a memory-mapped file holding a tile cache shared by all processes on a host
+#: (e.g. '/dev/shm/tcdjango-raster-cache'), None to disable
+RASTER_SHARED_CACHE_PATH: Optional[str] = None
+
+#: Size of the shared tile cache in bytes
+RASTER_SHARED_CACHE_SIZE: int = 1024 * 1024 * 1024  # 1 GB
+
+#: Maximum size of a single compressed tile in the shared tile cache in bytes
+RASTER_SHARED_CACHE_SLOT_SIZE: int = 1024 * 512  # 512 KB
+
+#: Path of a SQLite database persisting raw tiles (and PNGs) across restarts, None to disable
+DISK_CACHE_PATH: Optional[str] = None
+
+#: Size of the on-disk tile cache in bytes
+DISK_CACHE_SIZE: int = 1024 * 1024 * 1024 * 10  # 10 GB
+
+#: Whether to persist rendered PNGs in the on-disk tile cache as well
+DISK_CACHE_PNG: bool = True
 
 #: Send performance traces to AWS X-Ray
 XRAY_PROFILE: bool = False
@@ -229,6 +358,20 @@ XRAY_PROFILE: bool = False
 #: Compression level of output PNGs, from 0-9
 PNG_COMPRESS_LEVEL: int = 1
 
+#: Cache-Control max-age in seconds of empty (out-of-bounds or fully masked) tiles
+EMPTY_TILE_MAX_AGE: int = 60 * 60 * 24 * 7  # 1 week
+
+#: Size of rendered PNG in-memory cache in bytes
+PNG_CACHE_SIZE: int = 1024 * 1024 * 128  # 128 MB
+
+#: Eviction priority of the rendered PNG cache under CACHE_MEMORY_BUDGET
+PNG_CACHE_PRIORITY: int = 0
+
+#: Approximate combined size of all in-memory caches of a process in bytes, None for no
+#: shared limit (each cache is still bounded by its own size setting; file handles and
+#: other per-dataset state are not counted)
+CACHE_MEMORY_BUDGET: Optional[int] = None
+
 """
 CORS
 """
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ServerConfig(AppConfig):
     name = 'server'
+
+    def ready(self):
+        from server import signals  # noqa: F401
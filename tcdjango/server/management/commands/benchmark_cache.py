@@ -0,0 +1,90 @@
+"""benchmark_cache.py
+
+Compare compression codecs of the raster tile caches on real tiles.
+"""
+
+import time
+import itertools
+
+from django.core.management.base import BaseCommand, CommandError
+
+from server.utils import benchmark
+from server.utils.cache import CODECS, compress_ma, decompress_tuple
+
+MB = 1024 * 1024
+
+
+class Command(BaseCommand):
+    help = 'Benchmark tile cache compression codecs on tiles read from the given raster files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='+', help='Raster files to read tiles from.')
+        parser.add_argument(
+            '--codecs', nargs='+', default=list(CODECS),
+            help='Codecs to benchmark (default: all available: %(default)s)'
+        )
+        parser.add_argument(
+            '--levels', nargs='+', type=int, default=[1, 6, 9],
+            help='Compression levels to benchmark (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--num-tiles', type=int, default=50,
+            help='Number of tiles to read per raster file (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--tile-size', type=int, default=256,
+            help='Tile size in pixels (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Number of passes over all tiles per configuration (default: %(default)s)'
+        )
+
+    def handle(self, *args, **options):
+        unknown_codecs = set(options['codecs']) - set(CODECS)
+        if unknown_codecs:
+            raise CommandError(
+                f'Unknown or unavailable codecs: {", ".join(sorted(unknown_codecs))}'
+            )
+
+        tiles = []
+        for path in options['path']:
+            sample = benchmark.sample_tiles(
+                path, options['num_tiles'], tile_size=options['tile_size']
+            )
+            tiles.extend(benchmark.read_tiles(path, sample, tile_size=options['tile_size']))
+
+        if not tiles:
+            raise CommandError('No tiles could be read from the given files')
+
+        raw_size = sum(t.data.nbytes + t.mask.size // 8 for t in tiles)
+        self.stdout.write(f'Read {len(tiles)} tiles ({raw_size / MB:.1f} MB uncompressed)\n')
+
+        rows = []
+        configurations = itertools.product(options['codecs'], [False, True], options['levels'])
+        for codec, shuffle, level in configurations:
+            if codec == 'none' and (shuffle or level != options['levels'][0]):
+                continue
+
+            compress_time = decompress_time = 0.
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                compressed = [compress_ma(t, level, codec, shuffle) for t in tiles]
+                compress_time += time.perf_counter() - start
+
+                start = time.perf_counter()
+                for c in compressed:
+                    decompress_tuple(c)
+                decompress_time += time.perf_counter() - start
+
+            compressed_size = sum(len(c[0]) + len(c[1]) for c in compressed)
+            processed = raw_size * options['repeat'] / MB
+            rows.append((
+                codec, 'yes' if shuffle else 'no', level if codec != 'none' else '-',
+                processed / compress_time, processed / decompress_time,
+                raw_size / compressed_size
+            ))
+
+        self.stdout.write(benchmark.format_table(
+            ['codec', 'shuffle', 'level', 'compress MB/s', 'decompress MB/s', 'ratio'], rows
+        ))
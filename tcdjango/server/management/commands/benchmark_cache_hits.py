@@ -0,0 +1,128 @@
+"""benchmark_cache_hits.py
+
+Measure raster cache hit throughput under concurrent access.
+"""
+
+import time
+import random
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from server.utils import benchmark
+from server.utils.cache import CompressedLFUCache, ShardedCache
+
+
+class _GloballyLockedCache:
+    """Single cache behind one lock, the way tiles were cached before sharding"""
+
+    def __init__(self, cache):
+        self._cache = cache
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            return self._cache[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._cache[key] = value
+
+
+class Command(BaseCommand):
+    help = 'Benchmark raster cache hit throughput with increasing numbers of threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='+', help='Raster files to read tiles from.')
+        parser.add_argument(
+            '--threads', nargs='+', type=int, default=[1, 2, 4, 8],
+            help='Thread counts to benchmark (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--shards', type=int, default=16,
+            help='Number of shards of the sharded cache (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--num-tiles', type=int, default=50,
+            help='Number of tiles to read per raster file (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--tile-size', type=int, default=256,
+            help='Tile size in pixels (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--duration', type=float, default=2.,
+            help='Duration of each measurement in seconds (default: %(default)s)'
+        )
+        parser.add_argument('--codec', default='zlib', help='Cache codec (default: %(default)s)')
+        parser.add_argument(
+            '--level', type=int, default=1, help='Compression level (default: %(default)s)'
+        )
+
+    def handle(self, *args, **options):
+        tiles = []
+        for path in options['path']:
+            sample = benchmark.sample_tiles(
+                path, options['num_tiles'], tile_size=options['tile_size']
+            )
+            tiles.extend(benchmark.read_tiles(path, sample, tile_size=options['tile_size']))
+
+        if not tiles:
+            raise CommandError('No tiles could be read from the given files')
+
+        self.stdout.write(f'Read {len(tiles)} tiles\n')
+
+        maxsize = 1024 ** 3
+        caches = {
+            'global lock': _GloballyLockedCache(
+                CompressedLFUCache(maxsize, options['level'], codec=options['codec'])
+            ),
+            'sharded': ShardedCache(
+                maxsize, options['level'], codec=options['codec'], num_shards=options['shards']
+            )
+        }
+
+        rows = []
+        for name, cache in caches.items():
+            for key, tile in enumerate(tiles):
+                cache[key] = tile
+
+            baseline = None
+            for num_threads in options['threads']:
+                hits_per_second = self._measure(cache, len(tiles), num_threads,
+                                                options['duration'])
+                if baseline is None:
+                    baseline = hits_per_second / num_threads
+                rows.append((
+                    name, num_threads, hits_per_second, hits_per_second / baseline
+                ))
+
+        self.stdout.write(benchmark.format_table(
+            ['cache', 'threads', 'hits/s', 'speedup'], rows
+        ))
+
+    @staticmethod
+    def _measure(cache, num_keys: int, num_threads: int, duration: float) -> float:
+        counts = [0] * num_threads
+        start_barrier = threading.Barrier(num_threads + 1)
+        stop = threading.Event()
+
+        def worker(idx: int) -> None:
+            rng = random.Random(idx)
+            start_barrier.wait()
+            while not stop.is_set():
+                cache[rng.randrange(num_keys)]
+                counts[idx] += 1
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(num_threads)]
+        for thread in threads:
+            thread.start()
+
+        start_barrier.wait()
+        start = time.perf_counter()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        return sum(counts) / (time.perf_counter() - start)
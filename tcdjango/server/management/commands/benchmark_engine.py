@@ -0,0 +1,133 @@
+"""benchmark_engine.py
+
+Compare process and thread tile engines under concurrent load.
+"""
+
+from typing import List, Optional, Tuple
+
+import time
+import itertools
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import mercantile
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from server.utils import benchmark, exceptions
+from server.utils.executor import reset_executor
+from server.utils.raster_base import (RasterDriver, release_read, submit_read,
+                                      tile_read_kwargs)
+
+ENGINES = ('process', 'thread')
+
+# unique keys, so identical tiles of the workload are not coalesced into one read
+_request_ids = itertools.count()
+
+
+def _serve_tile(path: str, tile: mercantile.Tile, tile_size: int) -> Optional[float]:
+    """Read one tile through the tile engine, returns latency in ms (None if empty)"""
+    kwargs = tile_read_kwargs(
+        path, tile_bounds=mercantile.xy_bounds(tile), tile_size=(tile_size, tile_size),
+        preserve_values=False
+    )
+    retrieve = functools.partial(RasterDriver._get_raster_tile, **kwargs)
+    key = ('benchmark_engine', next(_request_ids))
+
+    start = time.perf_counter()
+    future, _ = submit_read(key, retrieve)
+    try:
+        future.result()
+    except exceptions.TileOutOfBoundsError:
+        return None
+    finally:
+        release_read(key, future)
+    return (time.perf_counter() - start) * 1000
+
+
+def _run_workload(workload: List[Tuple[str, mercantile.Tile]], tile_size: int,
+                  concurrency: int) -> Tuple[List[float], float]:
+    """Serve all tiles from the given number of client threads, returns latencies and wall time"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        latencies = list(clients.map(
+            lambda job: _serve_tile(job[0], job[1], tile_size), workload
+        ))
+    elapsed = time.perf_counter() - start
+    return [t for t in latencies if t is not None], elapsed
+
+
+class Command(BaseCommand):
+    help = 'Benchmark process and thread tile engines at several concurrency levels'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='+', help='Raster files to read tiles from.')
+        parser.add_argument(
+            '--engines', nargs='+', choices=ENGINES, default=list(ENGINES),
+            help='Tile engines to compare (default: all)'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, nargs='+', default=[1, 4, 16],
+            help='Numbers of concurrent clients (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=settings.RASTER_EXECUTOR_WORKERS,
+            help='Number of worker processes or threads (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--num-tiles', type=int, default=50,
+            help='Number of tiles to read per raster file (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--zoom', type=int,
+            help='Zoom level to sample tiles from (default: native zoom of each file)'
+        )
+        parser.add_argument(
+            '--tile-size', type=int, default=256,
+            help='Tile size in pixels (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=2,
+            help='Number of times every tile is requested (default: %(default)s)'
+        )
+
+    def handle(self, *args, **options):
+        tile_size = options['tile_size']
+
+        workload = []
+        for path in options['path']:
+            tiles = benchmark.sample_tiles(
+                path, options['num_tiles'], zoom=options['zoom'], tile_size=tile_size
+            )
+            workload.extend((path, tile) for tile in tiles)
+
+        if not workload:
+            raise CommandError('No tiles to read from the given files')
+
+        # same fixed workload for every engine and concurrency level
+        workload = workload * options['repeat']
+
+        rows = []
+        for engine in options['engines']:
+            with override_settings(RASTER_EXECUTOR=engine,
+                                   RASTER_EXECUTOR_WORKERS=options['workers']):
+                reset_executor()
+                try:
+                    # start workers, open files and warm GDAL's block cache
+                    _run_workload(workload[:options['workers'] * 2], tile_size,
+                                  options['workers'])
+
+                    for concurrency in options['concurrency']:
+                        latencies, elapsed = _run_workload(workload, tile_size, concurrency)
+                        p = benchmark.percentiles(latencies)
+                        rows.append((
+                            engine, options['workers'], concurrency, len(latencies),
+                            p[50], p[99], len(workload) / elapsed
+                        ))
+                finally:
+                    reset_executor()
+
+        self.stdout.write(benchmark.format_table(
+            ['engine', 'workers', 'concurrency', 'tiles', 'p50 ms', 'p99 ms', 'tiles/s'], rows
+        ))
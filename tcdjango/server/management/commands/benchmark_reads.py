@@ -0,0 +1,113 @@
+"""benchmark_reads.py
+
+Compare warped and direct tile reads of rasters in Web Mercator.
+"""
+
+import os
+import time
+
+import numpy as np
+import mercantile
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from server.utils import benchmark, exceptions
+from server.utils.raster_base import RasterDriver
+
+
+def _timed_reads(path, tiles, tile_size, repeat):
+    timings = []
+    results = []
+    for tile in tiles:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            try:
+                result = RasterDriver._get_raster_tile(
+                    path,
+                    reprojection_method=settings.REPROJECTION_METHOD,
+                    resampling_method=settings.RESAMPLING_METHOD,
+                    tile_bounds=mercantile.xy_bounds(tile),
+                    tile_size=(tile_size, tile_size)
+                )
+            except exceptions.TileOutOfBoundsError:
+                result = None
+        timings.append((time.perf_counter() - start) / repeat * 1000)
+        results.append(result)
+    return timings, results
+
+
+class Command(BaseCommand):
+    help = 'Benchmark warped against direct (unwarped) tile reads of EPSG:3857 rasters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='+', help='Raster files to read tiles from.')
+        parser.add_argument(
+            '--num-tiles', type=int, default=50,
+            help='Number of tiles to read per raster file (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--zoom', type=int, nargs='+',
+            help='Zoom levels to sample tiles from (default: native zoom of each file)'
+        )
+        parser.add_argument(
+            '--tile-size', type=int, default=256,
+            help='Tile size in pixels (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Number of reads per tile and mode (default: %(default)s)'
+        )
+
+    def handle(self, *args, **options):
+        import rasterio
+
+        rows = []
+        for path in options['path']:
+            with rasterio.open(path) as src:
+                crs = src.crs.to_string()
+
+            if not RasterDriver._is_target_crs(crs):
+                self.stderr.write(f'Skipping {path}: not in EPSG:3857 ({crs})')
+                continue
+
+            zooms = options['zoom'] or [None]
+            for zoom in zooms:
+                tiles = benchmark.sample_tiles(
+                    path, options['num_tiles'], zoom=zoom, tile_size=options['tile_size']
+                )
+                if not tiles:
+                    continue
+
+                timings = {}
+                results = {}
+                for direct in (False, True):
+                    with override_settings(RASTER_DIRECT_READ=direct):
+                        # first pass opens the file and warms GDAL's block cache
+                        _timed_reads(path, tiles[:1], options['tile_size'], 1)
+                        timings[direct], results[direct] = _timed_reads(
+                            path, tiles, options['tile_size'], options['repeat']
+                        )
+
+                mask_mismatch = []
+                for warped, direct in zip(results[False], results[True]):
+                    if warped is None or direct is None:
+                        continue
+                    mask_mismatch.append(np.mean(warped.mask != direct.mask) * 100)
+
+                warped_p = benchmark.percentiles(timings[False])
+                direct_p = benchmark.percentiles(timings[True])
+                rows.append((
+                    os.path.basename(path), tiles[0].z, len(tiles),
+                    warped_p[50], warped_p[99], direct_p[50], direct_p[99],
+                    warped_p[50] / direct_p[50],
+                    float(np.mean(mask_mismatch)) if mask_mismatch else float('nan')
+                ))
+
+        if not rows:
+            raise CommandError('None of the given files is in EPSG:3857')
+
+        self.stdout.write(benchmark.format_table(
+            ['file', 'zoom', 'tiles', 'warped p50 ms', 'warped p99 ms', 'direct p50 ms',
+             'direct p99 ms', 'speedup', 'mask mismatch %'], rows
+        ))
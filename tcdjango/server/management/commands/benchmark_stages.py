@@ -0,0 +1,73 @@
+"""benchmark_stages.py
+
+Break tile reads down into the time spent in each traced stage.
+"""
+
+import os
+
+import mercantile
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from server.utils import benchmark, exceptions
+from server.utils.profile import record_timings
+from server.utils.raster_base import RasterDriver
+
+
+class Command(BaseCommand):
+    help = 'Report per-stage timings of tile reads from the given raster files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='+', help='Raster files to read tiles from.')
+        parser.add_argument(
+            '--num-tiles', type=int, default=50,
+            help='Number of tiles to read per raster file (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--zoom', type=int,
+            help='Zoom level to sample tiles from (default: native zoom of each file)'
+        )
+        parser.add_argument(
+            '--tile-size', type=int, default=256,
+            help='Tile size in pixels (default: %(default)s)'
+        )
+
+    def handle(self, *args, **options):
+        tile_size = (options['tile_size'], options['tile_size'])
+
+        rows = []
+        for path in options['path']:
+            tiles = benchmark.sample_tiles(
+                path, options['num_tiles'], zoom=options['zoom'], tile_size=options['tile_size']
+            )
+            if not tiles:
+                continue
+
+            # warm up handle pool and GDAL caches outside of the measurement
+            benchmark.read_tiles(path, tiles[:1], tile_size=options['tile_size'])
+
+            with record_timings() as timings:
+                for tile in tiles:
+                    try:
+                        RasterDriver._get_raster_tile(
+                            path,
+                            reprojection_method=settings.REPROJECTION_METHOD,
+                            resampling_method=settings.RESAMPLING_METHOD,
+                            tile_bounds=mercantile.xy_bounds(tile),
+                            tile_size=tile_size
+                        )
+                    except exceptions.TileOutOfBoundsError:
+                        continue
+
+            name = os.path.basename(path)
+            kind = benchmark.mask_kind(path)
+            for stage, durations in timings.items():
+                p = benchmark.percentiles([d * 1000 for d in durations])
+                rows.append((name, kind, stage, len(durations), p[50], p[99]))
+
+        if not rows:
+            raise CommandError('No tiles could be read from the given files')
+
+        self.stdout.write(benchmark.format_table(
+            ['file', 'mask', 'stage', 'calls', 'p50 ms', 'p99 ms'], rows
+        ))
@@ -54,7 +54,13 @@ class Command(BaseCommand):
                     max=image_stats['range'][1],
                     mean=image_stats['mean'],
                     stdev=image_stats['stdev'],
-                    percentiles=image_stats['percentiles']            
+                    percentiles=image_stats['percentiles'],
+                    mercator_bounds=image_stats['mercator_bounds'],
+                    mercator_resolution=image_stats['mercator_resolution'],
+                    crs=image_stats['crs'],
+                    dtype=image_stats['dtype'],
+                    nodata=image_stats['nodata'],
+                    coverage=image_stats['coverage']
                 )
                 dataset_stats.save()
 
@@ -0,0 +1,92 @@
+"""replay_cache_log.py
+
+Replay a recorded tile access log against the available cache eviction policies.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from server.utils import benchmark
+from server.utils.cache_policies import POLICIES, make_cache
+
+
+def _parse_size(value: str) -> int:
+    units = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+    value = value.strip().lower()
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay a tile access log through each cache eviction policy and report hit ratios. '
+        'Every line of the log is one access; its first field is the tile key, an optional '
+        'second field gives the (compressed) tile size in bytes. Logs in this format are '
+        'written by the "server.tile_access" logger at INFO level.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('logfile', help='Tile access log to replay.')
+        parser.add_argument(
+            '--cache-size', type=_parse_size, nargs='+', default=[_parse_size('490m')],
+            help='Cache sizes to simulate, in bytes or with k/m/g suffix (default: 490m)'
+        )
+        parser.add_argument(
+            '--policies', nargs='+', default=list(POLICIES), choices=list(POLICIES),
+            help='Policies to replay (default: all)'
+        )
+        parser.add_argument(
+            '--tile-bytes', type=_parse_size, default=_parse_size('100k'),
+            help='Size assumed for log entries without size field (default: 100k)'
+        )
+
+    def handle(self, *args, **options):
+        accesses = []
+        with open(options['logfile']) as f:
+            for line in f:
+                fields = line.split()
+                if not fields:
+                    continue
+                try:
+                    size = int(fields[1]) if len(fields) > 1 else options['tile_bytes']
+                except ValueError:
+                    raise CommandError(f'Invalid size field in line: {line.strip()}')
+                accesses.append((fields[0], size))
+
+        if not accesses:
+            raise CommandError('Access log is empty')
+
+        unique_keys = len({key for key, _ in accesses})
+        self.stdout.write(f'Replaying {len(accesses)} accesses to {unique_keys} unique tiles\n')
+
+        rows = []
+        for cache_size in options['cache_size']:
+            for policy in options['policies']:
+                hits, byte_hits, total_bytes = self._replay(
+                    make_cache(policy, cache_size, getsizeof=lambda size: size), accesses
+                )
+                rows.append((
+                    cache_size // 1024 ** 2, policy,
+                    100. * hits / len(accesses), 100. * byte_hits / total_bytes
+                ))
+
+        self.stdout.write(benchmark.format_table(
+            ['cache MB', 'policy', 'hit ratio %', 'byte hit ratio %'], rows
+        ))
+
+    @staticmethod
+    def _replay(cache, accesses):
+        hits = byte_hits = total_bytes = 0
+        for key, size in accesses:
+            total_bytes += size
+            try:
+                cache[key]
+            except KeyError:
+                try:
+                    cache[key] = size
+                except ValueError:  # value too large
+                    pass
+            else:
+                hits += 1
+                byte_hits += size
+        return hits, byte_hits, total_bytes
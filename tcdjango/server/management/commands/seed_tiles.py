@@ -0,0 +1,271 @@
+"""seed_tiles.py
+
+Pre-render tiles into the persistent tile cache or an MBTiles file.
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import os
+import time
+import sqlite3
+import itertools
+import collections
+from concurrent.futures import ProcessPoolExecutor
+
+import tqdm
+import numpy as np
+import cachetools
+import mercantile
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from server.models import Collection, Dataset
+from server.utils import xyz, image, exceptions
+from server.utils.cache import compress_ma, pack_tuple
+from server.utils.cmaps import AVAILABLE_CMAPS
+from server.utils.coverage import get_coverage_index
+from server.utils.raster_base import (RasterDriver, RasterGeometry, get_disk_cache,
+                                      get_raster_geometry, raster_path, tile_read_kwargs)
+
+SeedResult = Tuple[Optional[bytes], Optional[bytes]]
+
+# tiles handed to the workers at a time, so jobs of large seeds are never all in memory
+CHUNK_SIZE = 1024
+
+
+def _render_tile(kwargs: Dict[str, Any], geometry: Optional[RasterGeometry],
+                 stretch_range: Sequence[float], colormap: str,
+                 keep_raster: bool) -> SeedResult:
+    """Read and render one tile, returns packed raster data and PNG (None if empty)"""
+    try:
+        tile_data = RasterDriver._get_raster_tile(geometry=geometry, **kwargs)
+    except exceptions.TileOutOfBoundsError:
+        return None, None
+
+    # requests for empty tiles are answered with the shared empty PNG, not from the cache
+    if np.ma.getmaskarray(tile_data).all():
+        return None, None
+
+    packed = None
+    if keep_raster:
+        packed = pack_tuple(compress_ma(
+            tile_data, settings.RASTER_CACHE_COMPRESS_LEVEL,
+            codec=settings.RASTER_CACHE_CODEC, shuffle=settings.RASTER_CACHE_SHUFFLE
+        ))
+
+    out = image.to_uint8(tile_data, *stretch_range)
+    png = image.array_to_png(out, colormap=colormap).getvalue()
+    return packed, png
+
+
+def _render_tile_star(args: Tuple) -> SeedResult:
+    return _render_tile(*args)
+
+
+class MBTilesWriter:
+    """Minimal writer for the MBTiles 1.3 format (PNG tiles)"""
+
+    def __init__(self, path: str, name: str, bounds: Sequence[float],
+                 zooms: Tuple[int, int]):
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS metadata (name TEXT, value TEXT);
+            CREATE TABLE IF NOT EXISTS tiles (
+                zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS tile_index
+                ON tiles (zoom_level, tile_column, tile_row);
+        """)
+        metadata = {
+            'name': name,
+            'format': 'png',
+            'type': 'overlay',
+            'version': '1.3',
+            'bounds': ','.join(map(str, bounds)),
+            'minzoom': str(zooms[0]),
+            'maxzoom': str(zooms[1]),
+        }
+        self._conn.execute('DELETE FROM metadata')
+        self._conn.executemany('INSERT INTO metadata VALUES (?, ?)', metadata.items())
+
+    def write(self, tile: mercantile.Tile, png: bytes) -> None:
+        # MBTiles uses TMS row numbering (origin at the bottom)
+        tile_row = 2 ** tile.z - 1 - tile.y
+        self._conn.execute(
+            'INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)', (tile.z, tile.x, tile_row, png)
+        )
+
+    def close(self) -> None:
+        self._conn.commit()
+        self._conn.close()
+
+
+class Command(BaseCommand):
+    help = 'Pre-render tiles of datasets into the persistent tile cache or an MBTiles file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-d', '--datasets', type=int, nargs='+', help='IDs of datasets to seed.'
+        )
+        parser.add_argument(
+            '-c', '--collection', type=int, help='ID of a collection whose datasets to seed.'
+        )
+        parser.add_argument('--min-zoom', type=int, required=True, help='Lowest zoom level.')
+        parser.add_argument('--max-zoom', type=int, required=True, help='Highest zoom level.')
+        parser.add_argument(
+            '--bbox', type=float, nargs=4, metavar=('WEST', 'SOUTH', 'EAST', 'NORTH'),
+            help='Only seed tiles intersecting this WGS84 bounding box.'
+        )
+        parser.add_argument(
+            '--mbtiles', help='Write PNG tiles to this MBTiles file instead of the tile cache.'
+        )
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='Number of worker processes (default: number of CPUs)'
+        )
+        parser.add_argument(
+            '--colormap', choices=AVAILABLE_CMAPS, default='gray',
+            help='Colormap of rendered PNG tiles (default: %(default)s)'
+        )
+        parser.add_argument('--stretch-min', type=float, help='Minimum stretch range value.')
+        parser.add_argument('--stretch-max', type=float, help='Maximum stretch range value.')
+        parser.add_argument(
+            '--tile-size', type=int, default=settings.DEFAULT_TILE_SIZE,
+            help='Tile size in pixels (default: %(default)s)'
+        )
+
+    def handle(self, *args, **options):
+        if options['datasets']:
+            datasets = list(Dataset.objects.select_related('stats').filter(
+                pk__in=options['datasets']
+            ))
+        elif options['collection']:
+            collection = Collection.objects.get(id=options['collection'])
+            datasets = list(collection.datasets.select_related('stats'))
+        else:
+            raise CommandError('Either --datasets or --collection must be given')
+
+        if not datasets:
+            raise CommandError('No datasets to seed')
+
+        if options['min_zoom'] > options['max_zoom']:
+            raise CommandError('--min-zoom must not be larger than --max-zoom')
+
+        disk_cache = None
+        writer = None
+        if options['mbtiles']:
+            if len(datasets) > 1:
+                raise CommandError('An MBTiles file can only hold tiles of a single dataset')
+            bounds = options['bbox'] or datasets[0].stats.get_bounds()
+            writer = MBTilesWriter(
+                options['mbtiles'], datasets[0].name, bounds,
+                (options['min_zoom'], options['max_zoom'])
+            )
+        else:
+            disk_cache = get_disk_cache()
+            if disk_cache is None:
+                raise CommandError('DISK_CACHE_PATH is not set, use --mbtiles instead')
+
+        tile_size = (options['tile_size'], options['tile_size'])
+        colormap = options['colormap']
+
+        # jobs are enumerated lazily, the number of tiles is only known at the end
+        jobs = self._enumerate_jobs(datasets, options)
+        chunks = iter(lambda: list(itertools.islice(jobs, CHUNK_SIZE)), [])
+        self.stdout.write(f'Seeding tiles of {len(datasets)} datasets')
+
+        keep_raster = disk_cache is not None
+        num_rendered = num_empty = 0
+        start = time.perf_counter()
+
+        def store(chunk: List[Tuple], results: Iterator[SeedResult]) -> None:
+            nonlocal num_rendered, num_empty
+
+            for (dataset, tile, kwargs, _, stretch_range), (packed, png) in zip(chunk, results):
+                progress.update()
+
+                if png is None:
+                    num_empty += 1
+                    continue
+
+                num_rendered += 1
+
+                if writer is not None:
+                    writer.write(tile, png)
+                    continue
+
+                png_key = image.png_cache_key(
+                    [dataset], (tile.x, tile.y, tile.z), colormap=colormap,
+                    stretch_ranges=[stretch_range], tile_size=tile_size
+                )
+                try:
+                    disk_cache[('raster', cachetools.keys.hashkey(**kwargs))] = packed
+                    if settings.DISK_CACHE_PNG:
+                        disk_cache[('png', png_key)] = png
+                except ValueError:  # value too large
+                    pass
+
+        with ProcessPoolExecutor(max_workers=options['processes']) as executor, \
+                tqdm.tqdm(unit='tile') as progress:
+            # keep the next chunk rendering while results of the previous one are stored
+            in_flight: collections.deque = collections.deque()
+            for chunk in chunks:
+                tasks = [
+                    (kwargs, geometry, stretch_range, colormap, keep_raster)
+                    for _, _, kwargs, geometry, stretch_range in chunk
+                ]
+                in_flight.append((chunk, executor.map(_render_tile_star, tasks, chunksize=8)))
+                if len(in_flight) > 1:
+                    store(*in_flight.popleft())
+
+            while in_flight:
+                store(*in_flight.popleft())
+
+        if writer is not None:
+            writer.close()
+
+        elapsed = time.perf_counter() - start
+        num_tiles = num_rendered + num_empty
+        self.stdout.write(
+            f'Rendered {num_rendered} tiles ({num_empty} empty) in {elapsed:.1f}s, '
+            f'{num_tiles / max(elapsed, 1e-9):.1f} tiles/s'
+        )
+
+    def _enumerate_jobs(self, datasets: List[Dataset], options: Dict[str, Any]) -> Iterator:
+        tile_size = (options['tile_size'], options['tile_size'])
+        zooms = range(options['min_zoom'], options['max_zoom'] + 1)
+
+        for dataset in datasets:
+            path = raster_path(dataset)
+            geometry = get_raster_geometry(dataset, path)
+            wgs_bounds = dataset.stats.get_bounds()
+            coverage_index = get_coverage_index(dataset.stats)
+
+            stretch_range = dataset.stats.get_range()
+            if options['stretch_min'] is not None and options['stretch_max'] is not None:
+                stretch_range = (options['stretch_min'], options['stretch_max'])
+
+            bbox = wgs_bounds
+            if options['bbox'] is not None:
+                west, south, east, north = options['bbox']
+                bbox = (
+                    max(west, wgs_bounds[0]), max(south, wgs_bounds[1]),
+                    min(east, wgs_bounds[2]), min(north, wgs_bounds[3])
+                )
+                if bbox[0] >= bbox[2] or bbox[1] >= bbox[3]:
+                    continue
+
+            for tile in itertools.chain.from_iterable(
+                mercantile.tiles(*bbox, zooms=[zoom]) for zoom in zooms
+            ):
+                if not xyz.tile_exists(wgs_bounds, tile.x, tile.y, tile.z):
+                    continue
+
+                if coverage_index is not None and not coverage_index.intersects(*tile):
+                    continue
+
+                kwargs = tile_read_kwargs(
+                    path, tile_bounds=mercantile.xy_bounds(tile), tile_size=tile_size,
+                    preserve_values=False
+                )
+                yield dataset, tile, kwargs, geometry, stretch_range
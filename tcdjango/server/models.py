@@ -81,6 +81,14 @@ class DatasetStats(models.Model):
     mean = models.FloatField()
     stdev = models.FloatField()
     percentiles = JSONField()
+    # reprojection geometry used by tile reads (Web Mercator bounds and resolution)
+    mercator_bounds = JSONField(blank=True, null=True)
+    mercator_resolution = JSONField(blank=True, null=True)
+    crs = models.CharField(max_length=256, blank=True, null=True)
+    dtype = models.CharField(max_length=16, blank=True, null=True)
+    nodata = models.FloatField(blank=True, null=True)
+    # bitmap of XYZ tiles intersecting valid data (see utils.coverage)
+    coverage = JSONField(blank=True, null=True)
 
     def __str__(self):
         return f'{Dataset.objects.get(stats=self.id).name} raster stats'
@@ -7,4 +7,13 @@ class PNGRenderer(renderers.BaseRenderer):
     render_style = 'binary'
 
     def render(self, data, media_type=None, renderer_context=None):
-        return data
\ No newline at end of file
+        return data
+
+class BatchRenderer(renderers.BaseRenderer):
+    media_type = 'application/octet-stream'
+    format = 'bin'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, media_type=None, renderer_context=None):
+        return data
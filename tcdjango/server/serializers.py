@@ -86,6 +86,46 @@ class RGBSerializer(serializers.Serializer):
         return data
 
 
+class BatchSerializer(serializers.Serializer):
+    datasets = serializers.ListField(child=serializers.IntegerField(), min_length=1)
+    tiles = serializers.ListField(
+        child=serializers.ListField(
+            child=serializers.IntegerField(min_value=0, max_value=2 ** 31 - 1),
+            min_length=3, max_length=3
+        ),
+        min_length=1
+    )
+    stretch_min = serializers.FloatField(required=False)
+    stretch_max = serializers.FloatField(required=False)
+    colormap = serializers.ChoiceField(choices=AVAILABLE_CMAPS, required=False)
+    tile_size = serializers.IntegerField(required=False)
+
+    def validate(self, data):
+        """
+        Check that stretch_min is below stretch_max, the batch is not too large and
+        all tiles exist
+        """
+        from django.conf import settings
+
+        if 'stretch_min' not in data or 'stretch_max' not in data:
+            pass
+        elif data['stretch_min'] > data['stretch_max']:
+            raise serializers.ValidationError("Max Stretch value must be greater than min")
+
+        num_tiles = len(data['datasets']) * len(data['tiles'])
+        if num_tiles > settings.BATCH_MAX_TILES:
+            raise serializers.ValidationError(
+                f"Batch contains {num_tiles} tiles, at most {settings.BATCH_MAX_TILES} are allowed"
+            )
+
+        for z, x, y in data['tiles']:
+            # check zoom first, 2 ** z of huge zoom levels exhausts memory
+            if z > settings.BATCH_MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+                raise serializers.ValidationError(f"Invalid tile {z}/{x}/{y}")
+
+        return data
+
+
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
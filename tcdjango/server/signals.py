@@ -0,0 +1,36 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from server.models import Dataset, DatasetStats
+from server.utils import handles
+from server.utils.coverage import forget_coverage_index
+from server.utils.raster_base import forget_raster_geometry, raster_path
+
+
+@receiver(pre_save, sender=Dataset)
+def remember_filepath(sender, instance, **kwargs):
+    # keep the previous file so its pooled handles can be dropped after saving
+    instance._previous_path = None
+    if instance.pk is not None:
+        previous = Dataset.objects.filter(pk=instance.pk).first()
+        if previous is not None and previous.filepath.name != instance.filepath.name:
+            instance._previous_path = raster_path(previous)
+
+
+@receiver(post_save, sender=Dataset)
+@receiver(post_delete, sender=Dataset)
+def invalidate_dataset_state(sender, instance, **kwargs):
+    paths = [getattr(instance, '_previous_path', None)]
+    if instance.filepath:
+        paths.append(raster_path(instance))
+
+    for path in paths:
+        if path is not None:
+            handles.invalidate(path)
+            forget_raster_geometry(path)
+
+
+@receiver(post_save, sender=DatasetStats)
+@receiver(post_delete, sender=DatasetStats)
+def invalidate_coverage_index(sender, instance, **kwargs):
+    forget_coverage_index(instance.pk)
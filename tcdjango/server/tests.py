@@ -1,3 +1,551 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, override_settings
 
-# Create your tests here.
+from unittest import mock
+from concurrent.futures import CancelledError, Future
+
+import os
+import time
+import tempfile
+import threading
+
+import numpy as np
+import mercantile
+
+from server.utils import admission, exceptions, executor, raster_base, scheduler
+from server.utils.batching import ReadBatcher
+from server.utils.coverage import CoverageIndex
+from server.utils.cache import _PACKED_HEADER, SharedMemoryCache, key_digest
+from server.utils.scheduler import PriorityScheduler
+
+
+class SubmitReadTests(SimpleTestCase):
+
+    def setUp(self):
+        self.scheduler = PriorityScheduler(1)
+        patchers = [
+            mock.patch.object(raster_base, 'get_scheduler', return_value=self.scheduler),
+            mock.patch.object(raster_base, 'get_executor'),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _submit_released(self, key, deadline):
+        future, is_owner = raster_base.submit_read(key, None, deadline=deadline)
+        self.assertTrue(is_owner)
+        future.add_done_callback(lambda f: raster_base.release_read(key, f))
+        return future
+
+    def test_expired_read_dropped_by_other_submit(self):
+        expired = time.monotonic() - 1
+
+        # only slot taken, first read stays queued
+        self.scheduler._running = 1
+        first = self._submit_released('first', expired)
+        self.assertFalse(first.done())
+
+        # slot frees up, next submit drops the expired read and releases it in its thread
+        self.scheduler._running = 0
+        thread = threading.Thread(target=self._submit_released, args=('second', expired),
+                                  daemon=True)
+        thread.start()
+        thread.join(timeout=5)
+
+        self.assertFalse(thread.is_alive(), 'submitting a read deadlocked')
+        self.assertIsInstance(first.exception(timeout=0), exceptions.TileDeadlineExceeded)
+        self.assertNotIn('first', raster_base._inflight)
+        self.assertNotIn('second', raster_base._inflight)
+
+
+@override_settings(RASTER_METATILE_SIZE=2)
+class MetatileTests(SimpleTestCase):
+
+
+    def setUp(self):
+        self.tile_bounds = tuple(mercantile.xy_bounds(1, 0, 1))
+        self.kwargs = raster_base.tile_read_kwargs(
+            'tile.tif', tile_bounds=self.tile_bounds, tile_size=(256, 256),
+            preserve_values=False
+        )
+        patcher = mock.patch.object(
+            raster_base, 'get_scheduler', return_value=PriorityScheduler(1)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cancelled_block_read_fails_tile(self):
+        block_future = Future()
+        block_future.cancel()
+
+        block = raster_base.metatile_read((1, 0, 1), self.kwargs)
+        with mock.patch.object(raster_base, 'submit_read', return_value=(block_future, False)):
+            future = raster_base.RasterDriver()._get_from_metatile(
+                block, None, raster_base.Priority.INTERACTIVE, None
+            )
+
+        self.assertIsInstance(future.exception(timeout=1), CancelledError)
+
+    def test_joining_block_read_is_not_shed(self):
+        dataset = mock.Mock()
+        dataset.filepath.path = 'tile.tif'
+
+        block = raster_base.metatile_read((1, 0, 1), self.kwargs)
+        block_future = Future()
+        raster_base._inflight[block.key] = block_future
+        self.addCleanup(raster_base._inflight.pop, block.key, None)
+
+        with mock.patch.object(raster_base.admission, 'admit', return_value=False), \
+                mock.patch.object(raster_base, 'get_raster_geometry', return_value=None):
+            future = raster_base.RasterDriver().get_raster_tile(
+                dataset, tile_bounds=self.tile_bounds, tile_size=(256, 256), asynchronous=True,
+                tile_xyz=(1, 0, 1)
+            )
+
+        tiles = [np.ma.masked_array(np.full((256, 256), i)) for i in range(4)]
+        block_future.set_result(tiles)
+        self.assertIs(future.result(timeout=1), tiles[1])
+
+
+class AlphaMaskTests(SimpleTestCase):
+
+    def test_blended_alpha_is_masked_for_all_types(self):
+        from rasterio.enums import Resampling
+
+        for dtype, opaque in (('uint8', 255), ('uint16', 65535), ('int16', 32767),
+                              ('float32', 255)):
+            with self.subTest(dtype=dtype):
+                alpha = np.array([0, opaque // 2, opaque - 1, opaque], dtype=dtype)
+                np.testing.assert_array_equal(
+                    raster_base.RasterDriver._alpha_mask(alpha, Resampling.bilinear),
+                    [True, True, True, False]
+                )
+                np.testing.assert_array_equal(
+                    raster_base.RasterDriver._alpha_mask(alpha, Resampling.nearest),
+                    [True, False, False, False]
+                )
+
+
+class CacheFillTests(SimpleTestCase):
+
+    def test_fill_runs_off_the_calling_thread(self):
+        proceed = threading.Event()
+        released = threading.Event()
+        fill_threads = []
+
+        def fill():
+            fill_threads.append(threading.current_thread())
+            proceed.wait(timeout=5)
+
+        raster_base.fill_cache_later(fill, released.set)
+
+        # caller returns while the fill still waits, the read is released after it
+        self.assertFalse(released.wait(timeout=0.1))
+        proceed.set()
+        self.assertTrue(released.wait(timeout=5))
+        self.assertNotIn(threading.current_thread(), fill_threads)
+
+    @override_settings(RASTER_CACHE_WRITE_QUEUE=1)
+    def test_full_queue_releases_uncached(self):
+        with mock.patch.object(raster_base, '_cache_fills', None):
+            proceed = threading.Event()
+            started = threading.Event()
+
+            def blocking_fill():
+                started.set()
+                proceed.wait(timeout=5)
+
+            raster_base.fill_cache_later(blocking_fill, lambda: None)
+            self.assertTrue(started.wait(timeout=5))
+            raster_base.fill_cache_later(lambda: None, lambda: None)
+
+            fill = mock.Mock()
+            release = mock.Mock()
+            raster_base.fill_cache_later(fill, release)
+            proceed.set()
+
+        release.assert_called_once_with()
+        fill.assert_not_called()
+
+
+class MetricsTests(SimpleTestCase):
+
+    def test_metrics_do_not_start_executor(self):
+        with mock.patch.object(executor, '_executor', None), \
+                mock.patch.object(scheduler, '_scheduler', None), \
+                mock.patch.object(scheduler, 'get_executor') as get_executor:
+            self.assertEqual(executor.executor_info()['workers'], 0)
+            self.assertEqual(raster_base.read_info()['scheduler']['slots'], 0)
+            self.assertEqual(admission.admission_info()['queue_depth'], 0)
+            get_executor.assert_not_called()
+
+
+class CoverageIndexTests(SimpleTestCase):
+
+    def _footprint(self, *coords):
+        return {'type': 'Polygon', 'coordinates': [[*coords, coords[0]]]}
+
+    def test_zoom_is_highest_within_max_tiles(self):
+        import mercantile
+
+        bounds = (10, 50, 11, 51)
+        index = CoverageIndex.from_geometry(
+            self._footprint((10, 50), (11, 50), (11, 51), (10, 51)), bounds, 16
+        )
+
+        def num_tiles(zoom):
+            return len(list(mercantile.tiles(*bounds, zooms=zoom)))
+
+        self.assertLessEqual(num_tiles(index.zoom), 16)
+        self.assertGreater(num_tiles(index.zoom + 1), 16)
+        self.assertLessEqual(index.mask.size, 16)
+
+    def test_intersects(self):
+        import mercantile
+
+        # triangle covering the south-west half of its bounds
+        index = CoverageIndex.from_geometry(
+            self._footprint((10, 50), (12, 50), (10, 52)), (10, 50, 12, 52), 1024
+        )
+
+        for zoom in (0, index.zoom - 2, index.zoom, index.zoom + 4):
+            with self.subTest(zoom=zoom):
+                self.assertTrue(index.intersects(*mercantile.tile(10.1, 50.1, zoom)))
+
+        self.assertFalse(index.intersects(*mercantile.tile(11.9, 51.9, index.zoom)))
+        self.assertFalse(index.intersects(*mercantile.tile(11.9, 51.9, index.zoom + 4)))
+        self.assertFalse(index.intersects(*mercantile.tile(-100, 0, index.zoom)))
+        self.assertFalse(index.intersects(*mercantile.tile(-100, 0, 2)))
+
+    def test_curved_footprint_edge(self):
+        import mercantile
+
+        # edge from south-west to north-east is curved in web mercator
+        index = CoverageIndex.from_geometry(
+            self._footprint((0, 0), (60, 70), (0, 70)), (0, 0, 60, 70), 65536
+        )
+
+        # tiles touching the edge from inside
+        for lon in np.linspace(1, 59, 100):
+            lat = lon * 70 / 60 + 1e-6
+            with self.subTest(lon=lon):
+                self.assertTrue(index.intersects(*mercantile.tile(lon, lat, index.zoom)))
+
+    def test_json_round_trip(self):
+        index = CoverageIndex.from_geometry(
+            self._footprint((10, 50), (12, 50), (10, 52)), (10, 50, 12, 52), 1000
+        )
+        restored = CoverageIndex.from_json(index.to_json())
+
+        self.assertEqual(
+            (restored.zoom, restored.x, restored.y), (index.zoom, index.x, index.y)
+        )
+        np.testing.assert_array_equal(restored.mask, index.mask)
+
+
+class ReadBatcherTests(SimpleTestCase):
+
+    def test_full_batch_resolved_outside_requester(self):
+        def dispatch(key, items):
+            future = Future()
+            future.set_result([f'{key}-{item}' for item in items])
+            return future
+
+        batcher = ReadBatcher(dispatch, window=60, max_size=2)
+        lock = threading.Lock()
+
+        acquired = []
+        called = threading.Event()
+
+        def callback(future):
+            # deadlocks (until the timeout) if run in the thread of the requester
+            acquired.append(lock.acquire(timeout=2))
+            if acquired[-1]:
+                lock.release()
+            called.set()
+
+        first = batcher.submit('a', 1)
+        first.add_done_callback(callback)
+
+        # requester filling the batch holds a lock the callback of the other request needs
+        with lock:
+            second = batcher.submit('a', 2)
+
+        self.assertEqual(first.result(timeout=5), 'a-1')
+        self.assertEqual(second.result(timeout=5), 'a-2')
+        self.assertTrue(called.wait(timeout=5))
+        self.assertEqual(acquired, [True])
+        self.assertEqual(batcher.info()['batches'], 1)
+
+
+class CachePolicyTests(SimpleTestCase):
+
+    def _fill_aging_cache(self, aging_period):
+        from server.utils.cache_policies import LFUAgingCache
+
+        cache = LFUAgingCache(3, aging_period=aging_period)
+        cache[1] = 'a'
+        for _ in range(5):
+            cache[1]
+        cache[2] = 'b'
+        cache[3] = 'c'
+        for _ in range(4):
+            cache[2]
+            cache[3]
+
+        cache[4] = 'd'
+        return cache
+
+    def test_lfu_aging_evicts_formerly_popular(self):
+        # counts are halved after 8 and 16 accesses, key 1 was only popular before
+        cache = self._fill_aging_cache(aging_period=8)
+        self.assertEqual(sorted(cache), [2, 3, 4])
+
+    def test_lfu_without_aging_keeps_popular(self):
+        # ties are broken by insertion order
+        cache = self._fill_aging_cache(aging_period=1000)
+        self.assertEqual(sorted(cache), [1, 3, 4])
+
+    def test_tinylfu_admission_contest(self):
+        from server.utils.cache_policies import WTinyLFUCache
+
+        # window of one entry, protected region of two
+        cache = WTinyLFUCache(3)
+        cache[1] = 'a'
+        cache[2] = 'b'  # 1 leaves the window into probation
+        cache[1]  # second hit promotes 1 to the protected region
+        cache[3] = 'c'  # 2 becomes candidate
+        for _ in range(5):
+            cache[3]
+
+        # candidate 2 is less popular than main region victim 1 and is evicted
+        cache[4] = 'd'
+        self.assertEqual(sorted(cache), [1, 3, 4])
+
+        # candidate 3 is more popular than main region victim 1 and replaces it
+        cache[5] = 'e'
+        self.assertEqual(sorted(cache), [3, 4, 5])
+
+    def test_tinylfu_resists_scans(self):
+        from server.utils.cache_policies import WTinyLFUCache
+
+        cache = WTinyLFUCache(5)
+        cache[1] = 'a'
+        cache[2] = 'b'
+        cache[1]
+        cache[1]
+
+        # a scan of one-hit keys never displaces the frequently used one
+        for key in range(100, 120):
+            cache[key] = 'x'
+            self.assertIn(1, cache)
+            self.assertLessEqual(cache.currsize, cache.maxsize)
+
+        self.assertIn(119, cache)
+
+
+class SharedMemoryCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, 'tiles')
+
+    def _cache(self, slot_size=1024 * 64):
+        return SharedMemoryCache(
+            self.path, 1024 * 1024, slot_size, compression_level=1, codec='none'
+        )
+
+    def test_concurrent_writes_of_one_process(self):
+        cache = self._cache()
+        values = [np.ma.masked_array(np.full((64, 64), i, dtype='float32')) for i in range(8)]
+
+        def write(value):
+            for _ in range(50):
+                cache['key'] = value
+
+        threads = [threading.Thread(target=write, args=(value,)) for value in values]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        result = cache['key']
+        self.assertTrue(any(np.array_equal(result, value) for value in values))
+        self.assertEqual(len(np.unique(result)), 1)
+
+    def test_different_layout_disables_cache(self):
+        value = np.ma.masked_array(np.ones((8, 8), dtype='float32'))
+        self._cache()['key'] = value
+        size = os.path.getsize(self.path)
+
+        cache = self._cache(slot_size=1024 * 32)
+        self.assertNotIn('key', cache)
+        cache['other'] = value
+        self.assertTrue(cache.disabled)
+        self.assertEqual(os.path.getsize(self.path), size)
+
+        # file is left intact for processes using the original layout
+        self.assertTrue(np.array_equal(self._cache()['key'], value))
+
+    def test_garbage_payload_is_miss(self):
+        from server.utils.cache import CODECS
+
+        value = np.ma.masked_array(np.arange(4096, dtype='float32').reshape(64, 64))
+        digest = key_digest('key')
+
+        # uncompressed garbage still decodes, only the sequence counter catches it
+        for codec in set(CODECS) - {'none'}:
+            with self.subTest(codec=codec):
+                cache = SharedMemoryCache(
+                    f'{self.path}-{codec}', 1024 * 1024, 1024 * 64, compression_level=1,
+                    codec=codec
+                )
+                cache['key'] = value
+                offset, = [
+                    offset for offset in cache._slot_offsets(digest)
+                    if cache._SLOT_HEADER.unpack_from(cache._mmap, offset)[2] == digest
+                ]
+
+                # clobber compressed data behind the packed header, as a racing writer would
+                start = offset + cache._SLOT_HEADER.size + _PACKED_HEADER.size
+                cache._mmap[start:start + 64] = b'\xff' * 64
+
+                with self.assertRaises(KeyError):
+                    cache['key']
+
+
+class BatchSerializerTests(SimpleTestCase):
+
+    def _errors(self, tiles):
+        from server.serializers import BatchSerializer
+
+        serializer = BatchSerializer(data={'datasets': [1], 'tiles': tiles})
+        serializer.is_valid()
+        return serializer.errors
+
+    def test_valid_tiles(self):
+        self.assertEqual(self._errors([[0, 0, 0], [30, 2 ** 30 - 1, 0]]), {})
+
+    def test_huge_zoom_rejected(self):
+        start = time.monotonic()
+        self.assertIn('non_field_errors', self._errors([[2 ** 31 - 1, 0, 0]]))
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_huge_coordinate_rejected(self):
+        self.assertIn('tiles', self._errors([[10 ** 12, 0, 0]]))
+
+    def test_tile_outside_grid_rejected(self):
+        self.assertIn('non_field_errors', self._errors([[2, 4, 0]]))
+
+
+class SeedTilesTests(SimpleTestCase):
+
+    def test_fully_masked_tile_is_not_stored(self):
+        from server.management.commands import seed_tiles
+
+        masked = np.ma.masked_all((256, 256), dtype='float32')
+        with mock.patch.object(raster_base.RasterDriver, '_get_raster_tile', return_value=masked):
+            result = seed_tiles._render_tile({}, None, (0, 1), 'gray', keep_raster=True)
+
+        self.assertEqual(result, (None, None))
+
+
+class PNGCacheKeyTests(SimpleTestCase):
+
+    def test_key_changes_with_read_settings(self):
+        from server.utils import image
+
+        dataset = mock.Mock(pk=1)
+        dataset.filepath.name = 'tile.tif'
+
+        def key():
+            return image.png_cache_key(
+                [dataset], (1, 2, 3), colormap='gray', stretch_ranges=[(0, 1)],
+                tile_size=(256, 256)
+            )
+
+        with override_settings(REPROJECTION_METHOD='nearest', RESAMPLING_METHOD='nearest'):
+            base_key = key()
+        with override_settings(REPROJECTION_METHOD='linear', RESAMPLING_METHOD='nearest'):
+            self.assertNotEqual(key(), base_key)
+        with override_settings(REPROJECTION_METHOD='nearest', RESAMPLING_METHOD='average'):
+            self.assertNotEqual(key(), base_key)
+
+
+class DegradedTileTests(SimpleTestCase):
+
+    def setUp(self):
+        self.dataset = mock.Mock(pk=1)
+        self.dataset.filepath.path = self.dataset.filepath.name = 'tile.tif'
+
+    def test_tile_cut_from_cached_parent(self):
+        parent_kwargs = raster_base.tile_read_kwargs(
+            'tile.tif', tile_bounds=mercantile.xy_bounds(1, 1, 1), tile_size=(4, 4),
+            preserve_values=False
+        )
+        parent_key = raster_base.cachetools.keys.hashkey(**parent_kwargs)
+        parent = np.ma.masked_array(np.arange(16).reshape(4, 4))
+        parent[1, 3] = np.ma.masked
+
+        def get_from_cache(key):
+            if key != parent_key:
+                raise KeyError(key)
+            return parent
+
+        driver = raster_base.RasterDriver()
+        with mock.patch.object(driver, '_get_from_cache', side_effect=get_from_cache):
+            # north-east quarter of the parent, scaled up by 2
+            tile = driver.get_degraded_tile(self.dataset, (3, 2, 2), tile_size=(4, 4))
+            self.assertIsNone(
+                driver.get_degraded_tile(self.dataset, (3, 2, 2), tile_size=(4, 4),
+                                         max_levels=0)
+            )
+
+        np.testing.assert_array_equal(tile.data, [[2, 2, 3, 3]] * 2 + [[6, 6, 7, 7]] * 2)
+        np.testing.assert_array_equal(
+            tile.mask, [[False] * 4] * 2 + [[False, False, True, True]] * 2
+        )
+
+    def _get_shed_tile(self, degraded_tile):
+        from rest_framework.test import APIRequestFactory
+        from server.views import singleband
+
+        # unique dataset, so the PNG is not served from the cache of another test
+        self.dataset.pk = id(degraded_tile)
+        metadata = mock.Mock()
+        metadata.get_range.return_value = (0, 16)
+
+        view = singleband.Singleband.as_view({'get': 'retrieve'})
+        request = APIRequestFactory().get('/singleband/1/2/3/2.png')
+        shed = exceptions.TileReadShedError('too many tile reads queued')
+
+        with mock.patch.object(singleband, 'get_object_or_404', return_value=self.dataset), \
+                mock.patch.object(singleband.DatasetStats.objects, 'get',
+                                  return_value=metadata), \
+                mock.patch.object(singleband.xyz, 'get_tile_data', side_effect=shed), \
+                mock.patch.object(singleband.RasterDriver, 'get_degraded_tile',
+                                  return_value=degraded_tile):
+            response = view(request, pk=1, z=2, x=3, y=2)
+            response.render()
+            return response
+
+    def test_shed_tile_served_degraded_uncached(self):
+        tile = np.ma.masked_array(np.arange(256 * 256).reshape(256, 256) % 16)
+        response = self._get_shed_tile(tile)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+
+    def test_empty_degraded_tile_not_cached(self):
+        response = self._get_shed_tile(np.ma.masked_all((256, 256)))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'no-store')
+
+    def test_shed_tile_without_cached_parent_unavailable(self):
+        response = self._get_shed_tile(None)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        self.assertIn('Retry-After', response)
@@ -9,6 +9,8 @@ from .views.singleband import Singleband
 from .views.colormap import ColormapViewSet
 from .views.metadata import DatasetStatsViewSet
 from .views.rgb import RGB
+from .views.batch import Batch
+from .views.metrics import Metrics
 from .views.tags import TagViewSet
 from .views.demo import demo
 
@@ -21,6 +23,14 @@ singleband_preview_view = Singleband.as_view({
     'get': 'preview'
 })
 
+batch_view = Batch.as_view({
+    'post': 'create'
+})
+
+metrics_view = Metrics.as_view({
+    'get': 'retrieve'
+})
+
 colormap_view = ColormapViewSet.as_view({
     'get': 'retrieve'
 })
@@ -45,6 +55,8 @@ urlpatterns = [
     path('singleband/<int:pk>/preview.png', singleband_preview_view, name='singleband-preview'),
     path('rgb/<int:r_id>/<int:g_id>/<int:b_id>/<int:z>/<int:x>/<int:y>.png', rgb_view, name='rgb'),
     path('rgb/<int:r_id>/<int:g_id>/<int:b_id>/preview.png', rgb_preview_view, name='rgb'),
+    path('batch', batch_view, name='batch'),
+    path('metrics', metrics_view, name='metrics'),
     path('colormap', colormap_view, name='colormap'),
     path('demo', demo, name='demo')
 ]
@@ -0,0 +1,54 @@
+"""admission.py
+
+Admission control of tile reads, sheds new reads while the scheduler is backed up.
+"""
+
+from typing import Any, Dict
+
+import threading
+
+from django.conf import settings
+
+from server.utils.scheduler import scheduler_load
+
+_counters = {'admitted': 0, 'shed': 0, 'degraded': 0}
+_counters_lock = threading.Lock()
+
+
+def is_overloaded() -> bool:
+    """Return whether a new tile read would wait too long for a worker.
+
+    That is the case while at least SHED_QUEUE_DEPTH reads are queued, or while the
+    oldest queued read has been waiting for more than SHED_QUEUE_LATENCY seconds.
+    """
+    max_depth = settings.SHED_QUEUE_DEPTH
+    max_latency = settings.SHED_QUEUE_LATENCY
+    if max_depth is None and max_latency is None:
+        return False
+
+    depth, latency = scheduler_load()
+    return (
+        (max_depth is not None and depth >= max_depth)
+        or (max_latency is not None and latency > max_latency)
+    )
+
+
+def admit() -> bool:
+    """Decide whether a new tile read may be scheduled, and count the decision."""
+    admitted = not is_overloaded()
+    with _counters_lock:
+        _counters['admitted' if admitted else 'shed'] += 1
+    return admitted
+
+
+def count_degraded() -> None:
+    """Count a shed tile that was answered from a lower zoom level."""
+    with _counters_lock:
+        _counters['degraded'] += 1
+
+
+def admission_info() -> Dict[str, Any]:
+    """Return admission counters and current queue depth and latency."""
+    depth, latency = scheduler_load()
+    with _counters_lock:
+        return dict(_counters, queue_depth=depth, queue_latency=latency)
@@ -0,0 +1,118 @@
+"""batching.py
+
+Group concurrent requests for the same resource into one task.
+"""
+
+from typing import Any, Callable, Dict, Hashable, List, Sequence
+from concurrent.futures import Future
+
+import functools
+import threading
+
+
+class ReadBatcher:
+    """Collects requests with the same key for a short window and dispatches them together.
+
+    The first request for a key opens a batch and starts a timer, requests arriving before
+    it fires join the batch. Batches are dispatched when the timer fires or once they hold
+    max_size requests, by calling ``dispatch(key, items)``. It returns a future of one result
+    per item; results that are exceptions are raised to the respective requester.
+
+    Batches are always dispatched from a thread of their own, never from the thread of a
+    requester, so futures of other requesters are not resolved while it may hold locks.
+    """
+
+    def __init__(self, dispatch: Callable[[Hashable, List[Any]], Future], *,
+                 window: float, max_size: int):
+        self.window = window
+        self.max_size = max_size
+        self.batches = 0
+        self.batched = 0
+        self._dispatch = dispatch
+        self._pending: Dict[Hashable, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: Hashable, item: Any, future: Future = None) -> Future:
+        """Add a request to the open batch of the given key, returns its future (the given
+        one, if any)"""
+        if future is None:
+            future = Future()
+
+        with self._lock:
+            batch = self._pending.get(key)
+            if batch is None:
+                batch = self._pending[key] = []
+                timer = threading.Timer(self.window, self._flush, args=(key, batch))
+                timer.daemon = True
+                timer.start()
+
+            batch.append((item, future))
+            is_full = len(batch) >= self.max_size
+            if is_full:
+                # close the batch, later requests open a new one
+                del self._pending[key]
+
+        if is_full:
+            thread = threading.Thread(target=self._dispatch_batch, args=(key, batch))
+            thread.daemon = True
+            thread.start()
+
+        return future
+
+    def _flush(self, key: Hashable, batch: List[Any]) -> None:
+        with self._lock:
+            # batch may already have been dispatched because it was full
+            if self._pending.get(key) is not batch:
+                return
+            del self._pending[key]
+
+        self._dispatch_batch(key, batch)
+
+    def _dispatch_batch(self, key: Hashable, batch: List[Any]) -> None:
+        with self._lock:
+            self.batches += 1
+            self.batched += len(batch)
+
+        items = [item for item, _ in batch]
+        futures = [future for _, future in batch]
+
+        try:
+            batch_future = self._dispatch(key, items)
+        except Exception as exc:
+            _resolve(futures, exc)
+            return
+
+        batch_future.add_done_callback(functools.partial(self._batch_done, futures=futures))
+
+    @staticmethod
+    def _batch_done(batch_future: Future, futures: Sequence[Future]) -> None:
+        if batch_future.cancelled():
+            for future in futures:
+                future.cancel()
+            return
+
+        exc = batch_future.exception()
+        if exc is not None:
+            _resolve(futures, exc)
+            return
+
+        for future, result in zip(futures, batch_future.result()):
+            _resolve([future], result)
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'batched': self.batched,
+                'pending': sum(len(batch) for batch in self._pending.values())
+            }
+
+
+def _resolve(futures: Sequence[Future], result: Any) -> None:
+    for future in futures:
+        if not future.set_running_or_notify_cancel():
+            continue
+        if isinstance(result, BaseException):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
@@ -0,0 +1,103 @@
+"""benchmark.py
+
+Helpers shared by the benchmark management commands.
+"""
+
+from typing import List, Sequence, Dict
+
+import math
+import random
+
+import numpy as np
+import mercantile
+
+EARTH_CIRCUMFERENCE = 2 * math.pi * 6378137
+
+
+def native_zoom(path: str, tile_size: int = 256) -> int:
+    """Return the smallest zoom level at which tiles show the full resolution of a raster"""
+    import rasterio
+    from rasterio import warp
+    from server.utils.raster_base import RasterDriver
+
+    with rasterio.open(path) as src:
+        dst_transform, _, _ = warp.calculate_default_transform(
+            src.crs, RasterDriver._TARGET_CRS, src.width, src.height, *src.bounds
+        )
+
+    resolution = min(abs(dst_transform.a), abs(dst_transform.e))
+    zoom = math.ceil(math.log2(EARTH_CIRCUMFERENCE / (resolution * tile_size)))
+    return min(max(zoom, 0), 22)
+
+
+def sample_tiles(path: str, num_tiles: int, zoom: int = None, tile_size: int = 256,
+                 seed: int = 0) -> List[mercantile.Tile]:
+    """Return a reproducible random sample of XYZ tiles covering the given raster"""
+    import rasterio
+    from rasterio import warp
+
+    if zoom is None:
+        zoom = native_zoom(path, tile_size)
+
+    with rasterio.open(path) as src:
+        bounds = warp.transform_bounds(src.crs, 'epsg:4326', *src.bounds, densify_pts=21)
+
+    tiles = list(mercantile.tiles(*bounds, zooms=[zoom]))
+    random.Random(seed).shuffle(tiles)
+    return tiles[:num_tiles]
+
+
+def read_tiles(path: str, tiles: Sequence[mercantile.Tile],
+               tile_size: int = 256) -> List[np.ma.MaskedArray]:
+    """Read the given XYZ tiles through the regular tile read path"""
+    from django.conf import settings
+    from server.utils import exceptions
+    from server.utils.raster_base import RasterDriver
+
+    out = []
+    for tile in tiles:
+        try:
+            out.append(RasterDriver._get_raster_tile(
+                path,
+                reprojection_method=settings.REPROJECTION_METHOD,
+                resampling_method=settings.RESAMPLING_METHOD,
+                tile_bounds=mercantile.xy_bounds(tile),
+                tile_size=(tile_size, tile_size)
+            ))
+        except exceptions.TileOutOfBoundsError:
+            continue
+    return out
+
+
+def percentiles(values: Sequence[float], qs: Sequence[float] = (50, 99)) -> Dict[float, float]:
+    """Return the given percentiles of a list of timings"""
+    if not values:
+        return {q: float('nan') for q in qs}
+    return dict(zip(qs, np.percentile(values, qs).tolist()))
+
+
+def format_table(header: Sequence[str], rows: Sequence[Sequence]) -> str:
+    """Format rows as a plain-text table with right-aligned columns"""
+    cells = [list(map(str, header))] + [
+        [f'{c:.2f}' if isinstance(c, float) else str(c) for c in row] for row in rows
+    ]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(header))]
+    lines = ['  '.join(c.rjust(w) for c, w in zip(row, widths)) for row in cells]
+    lines.insert(1, '  '.join('-' * w for w in widths))
+    return '\n'.join(lines)
+
+
+def mask_kind(path: str) -> str:
+    """Describe how invalid pixels of a raster are marked"""
+    import rasterio
+    from rasterio.enums import MaskFlags
+    from server.utils.raster_base import RasterDriver
+
+    with rasterio.open(path) as src:
+        if RasterDriver._has_alpha_band(src):
+            return 'alpha'
+        if MaskFlags.per_dataset in src.mask_flag_enums[0]:
+            return 'internal mask'
+        if src.nodata is not None:
+            return 'nodata'
+    return 'none'
@@ -3,27 +3,191 @@
 Custom cache implementations.
 """
 
-from typing import Tuple, Callable, Any
+from typing import Tuple, Callable, Any, Dict, List, Optional, Union
 
+import os
 import sys
+import mmap
 import zlib
+import time
+import struct
+import logging
+import sqlite3
+import hashlib
+import threading
 
 import numpy as np
-from cachetools import LFUCache
+from cachetools import Cache, LFUCache, LRUCache
 
-CompressionTuple = Tuple[bytes, bytes, str, Tuple[int, int]]
+from server.utils.cache_policies import make_cache
+
+logger = logging.getLogger(__name__)
+
+Buffer = Union[bytes, memoryview]
+CompressionTuple = Tuple[Buffer, Buffer, str, Tuple[int, int], str]
 SizeFunction = Callable[[CompressionTuple], int]
+Codec = Tuple[Callable[[Buffer, int], bytes], Callable[[Buffer], bytes]]
+
+# data length, mask length, dtype name, codec, rows, columns
+_PACKED_HEADER = struct.Struct('<QQ16s16sII')
+
+#: available compression codecs as (compress(buffer, level), decompress(buffer)) pairs
+CODECS: Dict[str, Codec] = {
+    'none': (lambda buf, level: bytes(buf), bytes),
+    'zlib': (zlib.compress, zlib.decompress),
+}
+
+try:
+    import lz4.frame
+except ImportError:  # pragma: no cover
+    pass
+else:
+    CODECS['lz4'] = (
+        lambda buf, level: lz4.frame.compress(buf, compression_level=level),
+        lz4.frame.decompress
+    )
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    pass
+else:
+    CODECS['zstd'] = (
+        lambda buf, level: zstandard.ZstdCompressor(level=level).compress(buf),
+        lambda buf: zstandard.ZstdDecompressor().decompress(buf)
+    )
+
+
+def get_codec(name: str) -> Codec:
+    """Return compress and decompress functions of the given codec"""
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(
+            f'unknown or unavailable cache codec {name} (available: {", ".join(CODECS)})'
+        ) from None
+
+
+def shuffle_bytes(buf: Buffer, itemsize: int) -> bytes:
+    """Group the n-th bytes of all items together, which makes multi-byte data compress better"""
+    return np.frombuffer(buf, dtype=np.uint8).reshape(-1, itemsize).T.tobytes()
+
+
+def unshuffle_bytes(buf: Buffer, itemsize: int) -> bytes:
+    """Inverse of :func:`shuffle_bytes`"""
+    return np.frombuffer(buf, dtype=np.uint8).reshape(itemsize, -1).T.tobytes()
+
+
+def compress_ma(arr: np.ma.MaskedArray, compression_level: int,
+                codec: str = 'zlib', shuffle: bool = False) -> CompressionTuple:
+    """Compress data and mask of a 2D masked array"""
+    compress, _ = get_codec(codec)
+
+    data = np.ascontiguousarray(arr.data)
+    codec_id = codec
+    if shuffle and data.dtype.itemsize > 1:
+        data = shuffle_bytes(data, data.dtype.itemsize)
+        codec_id = f'{codec}+shuffle'
+
+    compressed_data = compress(data, compression_level)
+    mask_to_int = np.packbits(np.ma.getmaskarray(arr).astype(np.uint8))
+    compressed_mask = compress(mask_to_int, compression_level)
+    return (
+        compressed_data,
+        compressed_mask,
+        # interned so all entries share one copy
+        sys.intern(arr.dtype.name),
+        arr.shape,
+        sys.intern(codec_id)
+    )
+
+
+def decompress_tuple(compressed_data: CompressionTuple) -> np.ma.MaskedArray:
+    """Inverse of :func:`compress_ma`"""
+    data_b, mask_b, dt, ds, codec_id = compressed_data
+    codec, _, filter_ = codec_id.partition('+')
+    _, decompress = get_codec(codec)
+
+    data_raw = decompress(data_b)
+    if filter_ == 'shuffle':
+        data_raw = unshuffle_bytes(data_raw, np.dtype(dt).itemsize)
+
+    data = np.frombuffer(data_raw, dtype=dt).reshape(ds)
+    mask = np.frombuffer(decompress(mask_b), dtype=np.uint8)
+    mask = np.unpackbits(mask)[:np.prod(ds)]
+    mask = mask.reshape(ds)
+    return np.ma.masked_array(data, mask=mask)
+
+
+def pack_tuple(compressed_data: CompressionTuple) -> bytes:
+    """Serialize a compression tuple to a flat byte string"""
+    data_b, mask_b, dt, (rows, cols), codec_id = compressed_data
+    header = _PACKED_HEADER.pack(
+        len(data_b), len(mask_b), dt.encode('ascii'), codec_id.encode('ascii'), rows, cols
+    )
+    return b''.join((header, data_b, mask_b))
+
+
+def unpack_tuple(buf: Buffer) -> CompressionTuple:
+    """Inverse of :func:`pack_tuple`. Returned buffers are views into ``buf``."""
+    view = memoryview(buf)
+    data_len, mask_len, dt, codec_id, rows, cols = _PACKED_HEADER.unpack_from(view)
+    offset = _PACKED_HEADER.size
+    data_b = view[offset:offset + data_len]
+    mask_b = view[offset + data_len:offset + data_len + mask_len]
+    return (
+        data_b,
+        mask_b,
+        dt.rstrip(b'\0').decode('ascii'),
+        (rows, cols),
+        codec_id.rstrip(b'\0').decode('ascii')
+    )
+
+
+#: rough allowance for the bytes retained per cache entry outside of its value (key,
+#: dict slots, policy state), which are not measured
+ENTRY_OVERHEAD = 512
+
+
+def compressed_size(compressed_data: CompressionTuple) -> int:
+    """Return the approximate bytes retained by a cached compression tuple"""
+    data_b, mask_b, _, shape, _ = compressed_data
+    return (
+        sys.getsizeof(compressed_data) + sys.getsizeof(data_b) + sys.getsizeof(mask_b)
+        + sys.getsizeof(shape) + ENTRY_OVERHEAD
+    )
+
+
+def bytes_size(value: bytes) -> int:
+    """Return the approximate bytes retained by a cached byte string"""
+    return sys.getsizeof(value) + ENTRY_OVERHEAD
+
+
+def key_digest(key: Any) -> bytes:
+    """Process-independent 16 byte digest of a (hashable, repr-stable) cache key"""
+    return hashlib.blake2b(repr(key).encode('utf-8'), digest_size=16).digest()
 
 
 class CompressedLFUCache(LFUCache):
-    """Least-frequently-used cache with ZLIB compression"""
+    """Least-frequently-used cache with compression (ZLIB by default)"""
 
-    def __init__(self, maxsize: int, compression_level: int):
+    def __init__(self, maxsize: int, compression_level: int,
+                 codec: str = 'zlib', shuffle: bool = False):
+        get_codec(codec)  # fail early for unavailable codecs
         super().__init__(maxsize, self._get_size)
         self.compression_level = compression_level
+        self.codec = codec
+        self.shuffle = shuffle
+        self.hits = 0
+        self.misses = 0
 
     def __getitem__(self, key: Any) -> np.ma.MaskedArray:
-        compressed_item = super().__getitem__(key)
+        try:
+            compressed_item = super().__getitem__(key)
+        except KeyError:
+            self.misses += 1
+            raise
+        self.hits += 1
         return self._decompress_tuple(compressed_item)
 
     def __setitem__(self, key: Any, value: np.ma.MaskedArray) -> None:
@@ -31,27 +195,542 @@ class CompressedLFUCache(LFUCache):
 
     def _compress_ma(self,
                      arr: np.ma.MaskedArray) -> CompressionTuple:
-        compressed_data = zlib.compress(arr.data, self.compression_level)
-        mask_to_int = np.packbits(arr.mask.astype(np.uint8))
-        compressed_mask = zlib.compress(mask_to_int, self.compression_level)
-        out = (
-            compressed_data,
-            compressed_mask,
-            arr.dtype.name,
-            arr.shape
-        )
-        return out
+        return compress_ma(arr, self.compression_level, self.codec, self.shuffle)
 
     def _decompress_tuple(self,
                           compressed_data: CompressionTuple) -> np.ma.MaskedArray:
-        data_b, mask_b, dt, ds = compressed_data
-        data = np.frombuffer(zlib.decompress(data_b), dtype=dt).reshape(ds)
-        mask = np.frombuffer(zlib.decompress(mask_b), dtype=np.uint8)
-        mask = np.unpackbits(mask)[:np.prod(ds)]
-        mask = mask.reshape(ds)
-        return np.ma.masked_array(data, mask=mask)
+        return decompress_tuple(compressed_data)
+
+    def info(self) -> Dict[str, int]:
+        """Return hit / miss counters and current fill level"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self),
+            'currsize': self.currsize,
+            'maxsize': self.maxsize
+        }
 
     @staticmethod
     def _get_size(x: Tuple) -> int:
-        sizes = map(sys.getsizeof, x)
-        return sum(sizes)
+        return compressed_size(x)
+
+
+class ShardedCache:
+    """Compressed tile cache split into independently locked shards.
+
+    Only the entry lookup and insertion happen under a (per-shard) lock, compression and
+    decompression run outside of it so concurrent hits do not serialize. Each shard evicts
+    according to the given policy (see :mod:`server.utils.cache_policies`).
+    """
+
+    def __init__(self, maxsize: int, compression_level: int,
+                 codec: str = 'zlib', shuffle: bool = False, num_shards: int = 16,
+                 policy: str = 'lfu'):
+        get_codec(codec)  # fail early for unavailable codecs
+        self.maxsize = maxsize
+        self.compression_level = compression_level
+        self.codec = codec
+        self.shuffle = shuffle
+        self.policy = policy
+        self.budget: Optional['MemoryBudget'] = None
+        self._shards = [
+            _CacheShard(make_cache(policy, maxsize // num_shards, compressed_size))
+            for _ in range(num_shards)
+        ]
+
+    def _get_shard(self, key: Any) -> '_CacheShard':
+        return self._shards[hash(key) % len(self._shards)]
+
+    def __getitem__(self, key: Any) -> np.ma.MaskedArray:
+        shard = self._get_shard(key)
+        with shard.lock:
+            try:
+                compressed_item = shard.cache[key]
+            except KeyError:
+                shard.misses += 1
+                raise
+            shard.hits += 1
+        return decompress_tuple(compressed_item)
+
+    def __contains__(self, key: Any) -> bool:
+        shard = self._get_shard(key)
+        with shard.lock:
+            return key in shard.cache
+
+    def __setitem__(self, key: Any, value: np.ma.MaskedArray) -> None:
+        compressed_item = compress_ma(value, self.compression_level, self.codec, self.shuffle)
+        shard = self._get_shard(key)
+        with shard.lock:
+            shard.cache[key] = compressed_item
+
+        if self.budget is not None:
+            self.budget.enforce()
+
+    def __len__(self) -> int:
+        return sum(len(shard.cache) for shard in self._shards)
+
+    @property
+    def currsize(self) -> int:
+        return sum(shard.cache.currsize for shard in self._shards)
+
+    def evict(self) -> int:
+        """Evict one entry from the fullest shard and return the number of bytes freed"""
+        shard = max(self._shards, key=lambda s: s.cache.currsize)
+        with shard.lock:
+            before = shard.cache.currsize
+            try:
+                shard.cache.popitem()
+            except KeyError:  # empty
+                return 0
+            return before - shard.cache.currsize
+
+    def info(self) -> Dict[str, Any]:
+        """Return hit / miss counters and current fill level"""
+        info: Dict[str, Any] = dict(hits=0, misses=0, entries=0, currsize=0)
+        for shard in self._shards:
+            with shard.lock:
+                info['hits'] += shard.hits
+                info['misses'] += shard.misses
+                info['entries'] += len(shard.cache)
+                info['currsize'] += shard.cache.currsize
+        info['maxsize'] = self.maxsize
+        info['shards'] = len(self._shards)
+        info['policy'] = self.policy
+        return info
+
+
+class _CacheShard:
+    __slots__ = ('cache', 'lock', 'hits', 'misses')
+
+    def __init__(self, cache: Cache):
+        self.cache = cache
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+
+class ByteLRUCache:
+    """Thread-safe least-recently-used cache of encoded byte strings (e.g. rendered PNGs)"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.budget: Optional['MemoryBudget'] = None
+        self.hits = 0
+        self.misses = 0
+        self._cache = LRUCache(maxsize, bytes_size)
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key: Any) -> bytes:
+        with self._lock:
+            try:
+                value = self._cache[key]
+            except KeyError:
+                self.misses += 1
+                raise
+            self.hits += 1
+            return value
+
+    def __contains__(self, key: Any) -> bool:
+        with self._lock:
+            return key in self._cache
+
+    def __setitem__(self, key: Any, value: bytes) -> None:
+        with self._lock:
+            self._cache[key] = value
+
+        if self.budget is not None:
+            self.budget.enforce()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    @property
+    def currsize(self) -> int:
+        return self._cache.currsize
+
+    def evict(self) -> int:
+        """Evict the least recently used entry and return the number of bytes freed"""
+        with self._lock:
+            before = self._cache.currsize
+            try:
+                self._cache.popitem()
+            except KeyError:  # empty
+                return 0
+            return before - self._cache.currsize
+
+    def info(self) -> Dict[str, int]:
+        """Return hit / miss counters and current fill level"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._cache),
+                'currsize': self._cache.currsize,
+                'maxsize': self.maxsize
+            }
+
+
+class MemoryBudget:
+    """Process-wide byte budget shared by several in-memory caches.
+
+    Caches register with a priority. Whenever their combined size exceeds ``maxsize``,
+    entries are evicted from the lowest-priority cache first (each cache still evicts
+    according to its own policy), until the total fits again.
+
+    Sizes are approximate: payloads and their containers are measured, keys and policy
+    state are covered by the fixed ENTRY_OVERHEAD. Memory outside of the caches, like
+    open file handles and registries of dataset geometry and coverage, is not counted.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._members: List[Tuple[int, Any]] = []
+        self._lock = threading.Lock()
+
+    def register(self, cache: Any, priority: int) -> None:
+        """Add a cache with ``currsize`` attribute and ``evict()`` method to the budget"""
+        with self._lock:
+            self._members.append((priority, cache))
+            self._members.sort(key=lambda member: member[0])
+        cache.budget = self
+
+    @property
+    def currsize(self) -> int:
+        return sum(cache.currsize for _, cache in self._members)
+
+    def enforce(self) -> None:
+        """Evict entries until all caches fit into the budget"""
+        excess = self.currsize - self.maxsize
+        if excess <= 0:
+            return
+
+        with self._lock:
+            excess = self.currsize - self.maxsize
+            for _, cache in self._members:
+                while excess > 0:
+                    freed = cache.evict()
+                    if not freed:
+                        break
+                    self.evictions += 1
+                    excess -= freed
+
+    def info(self) -> Dict[str, int]:
+        """Return current fill level and number of budget-enforced evictions"""
+        return {
+            'currsize': self.currsize,
+            'maxsize': self.maxsize,
+            'evictions': self.evictions
+        }
+
+
+class SharedMemoryCache:
+    """Host-wide tile cache in a memory-mapped file, shared by all processes mapping it.
+
+    The file is split into fixed-size slots organized as a set-associative table. Writers
+    lock the slot they replace with a POSIX byte-range lock, readers are lock-free and
+    validate every read against a per-slot sequence counter (seqlock). Byte-range locks
+    only exclude other processes, so threads of a process also serialize their writes.
+    Payloads are decompressed straight out of the mapping, so hits do not copy the
+    compressed tile.
+
+    An existing file created with a different slot layout is never reinitialized, since
+    other processes may still map it; the cache stays disabled instead.
+
+    Exposes the same item interface as :class:`CompressedLFUCache`.
+    """
+
+    _MAGIC = b'TCTILES2'
+    # magic, slot size, number of slots
+    _FILE_HEADER = struct.Struct('<8sQQ')
+    # sequence counter, write timestamp, key digest, payload length
+    _SLOT_HEADER = struct.Struct('<QQ16sQ')
+    _WAYS = 4
+
+    def __init__(self, path: str, maxsize: int, slot_size: int, compression_level: int,
+                 codec: str = 'zlib', shuffle: bool = False):
+        get_codec(codec)  # fail early for unavailable codecs
+        if slot_size <= self._SLOT_HEADER.size:
+            raise ValueError('slot_size is too small')
+
+        self.path = path
+        self.slot_size = slot_size
+        self.num_slots = max(self._WAYS, (maxsize - self._FILE_HEADER.size) // slot_size)
+        self.maxsize = self._FILE_HEADER.size + self.num_slots * slot_size
+        self.compression_level = compression_level
+        self.codec = codec
+        self.shuffle = shuffle
+        self.hits = 0
+        self.misses = 0
+        self.disabled = False
+        self._pid: Optional[int] = None
+        self._fd = -1
+        self._mmap: Optional[mmap.mmap] = None
+        self._write_lock = threading.Lock()
+
+    def _ensure_mapped(self) -> Optional[mmap.mmap]:
+        """Return the mapping of the cache file, None if the cache is disabled"""
+        if self.disabled:
+            return None
+
+        # mappings and file descriptors are not shared with forked children
+        if self._mmap is not None and self._pid == os.getpid():
+            return self._mmap
+
+        import fcntl
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(fd, self._FILE_HEADER.size, 0)
+            expected = self._FILE_HEADER.pack(self._MAGIC, self.slot_size, self.num_slots)
+            if not header:
+                # new file
+                os.ftruncate(fd, self.maxsize)
+                os.pwrite(fd, expected, 0)
+            elif header != expected:
+                logger.error(
+                    'Shared tile cache %s has a different layout than configured, disabling '
+                    'it (remove the file once no process uses it)', self.path
+                )
+                self.disabled = True
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN)
+
+        if self.disabled:
+            os.close(fd)
+            return None
+
+        self._fd = fd
+        self._mmap = mmap.mmap(fd, self.maxsize)
+        self._pid = os.getpid()
+        # a lock held by another thread while forking would stay locked in the child
+        self._write_lock = threading.Lock()
+        return self._mmap
+
+    def _slot_offsets(self, digest: bytes) -> Tuple[int, ...]:
+        first = int.from_bytes(digest[:8], 'little') % self.num_slots
+        return tuple(
+            self._FILE_HEADER.size + ((first + i) % self.num_slots) * self.slot_size
+            for i in range(self._WAYS)
+        )
+
+    def _read_slot(self, mm: mmap.mmap, offset: int,
+                   digest: bytes) -> Optional[np.ma.MaskedArray]:
+        seq, _, slot_digest, length = self._SLOT_HEADER.unpack_from(mm, offset)
+        if seq % 2 or slot_digest != digest:
+            return None
+
+        payload_start = offset + self._SLOT_HEADER.size
+        view = memoryview(mm)[payload_start:payload_start + length]
+        try:
+            result = decompress_tuple(unpack_tuple(view))
+        except Exception:
+            # torn read, slot was overwritten concurrently (every codec fails differently
+            # on garbage, e.g. RuntimeError for lz4 and ZstdError for zstd)
+            return None
+
+        if self._SLOT_HEADER.unpack_from(mm, offset)[0] != seq:
+            return None
+
+        return result
+
+    def __getitem__(self, key: Any) -> np.ma.MaskedArray:
+        mm = self._ensure_mapped()
+        if mm is None:
+            raise KeyError(key)
+
+        digest = key_digest(key)
+
+        for offset in self._slot_offsets(digest):
+            result = self._read_slot(mm, offset, digest)
+            if result is not None:
+                self.hits += 1
+                return result
+
+        self.misses += 1
+        raise KeyError(key)
+
+    def __contains__(self, key: Any) -> bool:
+        mm = self._ensure_mapped()
+        if mm is None:
+            return False
+
+        digest = key_digest(key)
+        return any(
+            self._SLOT_HEADER.unpack_from(mm, offset)[2] == digest
+            for offset in self._slot_offsets(digest)
+        )
+
+    def __setitem__(self, key: Any, value: np.ma.MaskedArray) -> None:
+        import fcntl
+
+        payload = pack_tuple(
+            compress_ma(value, self.compression_level, self.codec, self.shuffle)
+        )
+        if len(payload) > self.slot_size - self._SLOT_HEADER.size:
+            raise ValueError('value too large')
+
+        mm = self._ensure_mapped()
+        if mm is None:
+            return
+
+        digest = key_digest(key)
+
+        with self._write_lock:
+            # replace matching slot, else the least recently written one
+            candidates = []
+            for offset in self._slot_offsets(digest):
+                _, stamp, slot_digest, _ = self._SLOT_HEADER.unpack_from(mm, offset)
+                if slot_digest == digest:
+                    stamp = -1
+                candidates.append((stamp, offset))
+            _, offset = min(candidates)
+
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, self.slot_size, offset)
+            try:
+                seq = self._SLOT_HEADER.unpack_from(mm, offset)[0]
+                # odd sequence number marks the slot as being written
+                struct.pack_into('<Q', mm, offset, seq + 1)
+                payload_start = offset + self._SLOT_HEADER.size
+                mm[payload_start:payload_start + len(payload)] = payload
+                self._SLOT_HEADER.pack_into(
+                    mm, offset, seq + 2, int(time.time() * 1e6), digest, len(payload)
+                )
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, self.slot_size, offset)
+
+    def info(self) -> Dict[str, int]:
+        """Return hit / miss counters of this process and the size of the arena"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'disabled': self.disabled,
+            'slots': self.num_slots,
+            # the arena is mapped as a whole and shared by all processes
+            'currsize': self.maxsize,
+            'maxsize': self.maxsize
+        }
+
+
+class SQLiteCache:
+    """Size-bounded persistent cache of byte strings in a local SQLite database.
+
+    Survives restarts and can be shared by all processes on a host. Entries are evicted
+    in order of last access once the total payload size exceeds ``maxsize``.
+    """
+
+    _SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS tiles ('
+        'key BLOB PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, atime REAL NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS tiles_atime ON tiles (atime)',
+        'CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)',
+        "INSERT OR IGNORE INTO meta (name, value) VALUES ('total_size', 0)",
+    )
+
+    #: number of entries deleted at once when the cache is full
+    _EVICT_BATCH = 64
+
+    #: only refresh access time of entries that were not accessed this recently (seconds)
+    _ATIME_RESOLUTION = 60
+
+    def __init__(self, path: str, maxsize: int):
+        self.path = path
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # connections must not be shared across threads or forked processes
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        for statement in self._SCHEMA:
+            conn.execute(statement)
+
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def __getitem__(self, key: Any) -> bytes:
+        conn = self._connection()
+        digest = key_digest(key)
+
+        row = conn.execute(
+            'SELECT value, atime FROM tiles WHERE key = ?', (digest,)
+        ).fetchone()
+
+        if row is None:
+            self.misses += 1
+            raise KeyError(key)
+
+        value, atime = row
+        now = time.time()
+        if now - atime > self._ATIME_RESOLUTION:
+            conn.execute('UPDATE tiles SET atime = ? WHERE key = ?', (now, digest))
+
+        self.hits += 1
+        return value
+
+    def __contains__(self, key: Any) -> bool:
+        row = self._connection().execute(
+            'SELECT 1 FROM tiles WHERE key = ?', (key_digest(key),)
+        ).fetchone()
+        return row is not None
+
+    def __setitem__(self, key: Any, value: bytes) -> None:
+        size = len(value)
+        if size > self.maxsize:
+            raise ValueError('value too large')
+
+        conn = self._connection()
+        digest = key_digest(key)
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT size FROM tiles WHERE key = ?', (digest,)).fetchone()
+            old_size = row[0] if row is not None else 0
+            conn.execute(
+                'INSERT OR REPLACE INTO tiles (key, value, size, atime) VALUES (?, ?, ?, ?)',
+                (digest, sqlite3.Binary(value), size, time.time())
+            )
+            total_size = self._update_total_size(conn, size - old_size)
+
+            while total_size > self.maxsize:
+                victims = conn.execute(
+                    'SELECT key, size FROM tiles WHERE key != ? ORDER BY atime LIMIT ?',
+                    (digest, self._EVICT_BATCH)
+                ).fetchall()
+                if not victims:
+                    break
+                conn.executemany('DELETE FROM tiles WHERE key = ?', [(k,) for k, _ in victims])
+                total_size = self._update_total_size(conn, -sum(s for _, s in victims))
+
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def _update_total_size(conn: sqlite3.Connection, delta: int) -> int:
+        conn.execute("UPDATE meta SET value = value + ? WHERE name = 'total_size'", (delta,))
+        return conn.execute("SELECT value FROM meta WHERE name = 'total_size'").fetchone()[0]
+
+    def info(self) -> Dict[str, int]:
+        """Return hit / miss counters of this process and current fill level"""
+        conn = self._connection()
+        entries = conn.execute('SELECT COUNT(*) FROM tiles').fetchone()[0]
+        currsize = conn.execute("SELECT value FROM meta WHERE name = 'total_size'").fetchone()[0]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': entries,
+            'currsize': currsize,
+            'maxsize': self.maxsize
+        }
@@ -0,0 +1,233 @@
+"""cache_policies.py
+
+Eviction policies for the raster tile caches.
+"""
+
+from typing import Any, Callable, Dict, Hashable, Type
+
+import collections
+
+from cachetools import Cache, LFUCache, LRUCache
+
+_MISSING = object()
+
+
+class LFUAgingCache(Cache):
+    """Least-frequently-used cache whose frequency counts decay over time.
+
+    All counts are halved every ``aging_period`` accesses, so entries that were popular
+    a while ago eventually make room for the current area of interest.
+    """
+
+    def __init__(self, maxsize: int, getsizeof: Callable = None, aging_period: int = 10000):
+        Cache.__init__(self, maxsize, getsizeof)
+        self.__counts: Dict[Hashable, int] = {}
+        self.__aging_period = aging_period
+        self.__accesses = 0
+
+    def __getitem__(self, key: Hashable, cache_getitem: Callable = Cache.__getitem__) -> Any:
+        value = cache_getitem(self, key)
+        self.__touch(key)
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any,
+                    cache_setitem: Callable = Cache.__setitem__) -> None:
+        cache_setitem(self, key, value)
+        self.__touch(key)
+
+    def __delitem__(self, key: Hashable, cache_delitem: Callable = Cache.__delitem__) -> None:
+        cache_delitem(self, key)
+        del self.__counts[key]
+
+    def popitem(self) -> Any:
+        """Remove and return the `(key, value)` pair least frequently used."""
+        try:
+            # ties are broken by insertion order
+            key = min(self.__counts, key=self.__counts.__getitem__)
+        except ValueError:
+            raise KeyError(f'{type(self).__name__} is empty') from None
+
+        value = Cache.__getitem__(self, key)
+        del self[key]
+        return key, value
+
+    def clear(self) -> None:
+        Cache.clear(self)
+        self.__counts.clear()
+
+    def __touch(self, key: Hashable) -> None:
+        self.__counts[key] = self.__counts.get(key, 0) + 1
+        self.__accesses += 1
+
+        if self.__accesses >= self.__aging_period:
+            self.__accesses = 0
+            for k, count in self.__counts.items():
+                self.__counts[k] = count // 2
+
+
+class FrequencySketch:
+    """Approximate access frequencies of keys in a count-min sketch.
+
+    Counters saturate at 15 and are halved once ``10 * width`` keys have been added,
+    so the sketch favors recent popularity (TinyLFU aging).
+    """
+
+    _DEPTH = 4
+    _MAX_COUNT = 15
+
+    def __init__(self, width: int = 4096):
+        width = 1 << (max(width, 16) - 1).bit_length()
+        self._mask = width - 1
+        self._rows = [[0] * width for _ in range(self._DEPTH)]
+        self._additions = 0
+        self._sample_size = 10 * width
+
+    def _indexes(self, key: Hashable) -> Any:
+        key_hash = hash(key)
+        return ((row, hash((key_hash, i)) & self._mask) for i, row in enumerate(self._rows))
+
+    def add(self, key: Hashable) -> None:
+        for row, idx in self._indexes(key):
+            if row[idx] < self._MAX_COUNT:
+                row[idx] += 1
+
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._additions //= 2
+            for row in self._rows:
+                row[:] = [count >> 1 for count in row]
+
+    def estimate(self, key: Hashable) -> int:
+        return min(row[idx] for row, idx in self._indexes(key))
+
+
+class WTinyLFUCache(Cache):
+    """Window TinyLFU cache.
+
+    New entries enter a small LRU window. Entries leaving the window are candidates for
+    the main (segmented LRU) region and only stay there if the frequency sketch rates them
+    more popular than the main region's eviction victim. This keeps one-hit-wonder tiles
+    from flushing frequently used ones.
+    """
+
+    def __init__(self, maxsize: int, getsizeof: Callable = None,
+                 window_ratio: float = 0.01, protected_ratio: float = 0.8,
+                 sketch_width: int = 4096):
+        Cache.__init__(self, maxsize, getsizeof)
+        self.__window: Dict[Hashable, int] = collections.OrderedDict()
+        self.__probation: Dict[Hashable, int] = collections.OrderedDict()
+        self.__protected: Dict[Hashable, int] = collections.OrderedDict()
+        self.__candidates: Dict[Hashable, None] = collections.OrderedDict()
+        self.__window_size = self.__protected_size = 0
+        self.__window_maxsize = max(1, int(maxsize * window_ratio))
+        self.__protected_maxsize = int(maxsize * protected_ratio)
+        self.__sketch = FrequencySketch(sketch_width)
+
+    def __getitem__(self, key: Hashable, cache_getitem: Callable = Cache.__getitem__) -> Any:
+        self.__sketch.add(key)
+        value = cache_getitem(self, key)
+
+        if key in self.__window:
+            self.__window.move_to_end(key)
+        elif key in self.__protected:
+            self.__protected.move_to_end(key)
+        else:
+            # second hit in the main region: promote from probation to protected
+            size = self.__probation.pop(key)
+            self.__candidates.pop(key, None)
+            self.__protected[key] = size
+            self.__protected_size += size
+
+            while self.__protected_size > self.__protected_maxsize and len(self.__protected) > 1:
+                demoted_key, demoted_size = self.__protected.popitem(last=False)
+                self.__protected_size -= demoted_size
+                self.__probation[demoted_key] = demoted_size
+
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any,
+                    cache_setitem: Callable = Cache.__setitem__) -> None:
+        if key in self:
+            del self[key]
+
+        cache_setitem(self, key, value)
+
+        size = self.getsizeof(value)
+        self.__window[key] = size
+        self.__window_size += size
+
+        while self.__window_size > self.__window_maxsize and len(self.__window) > 1:
+            candidate_key, candidate_size = self.__window.popitem(last=False)
+            self.__window_size -= candidate_size
+            self.__probation[candidate_key] = candidate_size
+            self.__candidates[candidate_key] = None
+
+    def __delitem__(self, key: Hashable, cache_delitem: Callable = Cache.__delitem__) -> None:
+        cache_delitem(self, key)
+
+        if key in self.__window:
+            self.__window_size -= self.__window.pop(key)
+        elif key in self.__protected:
+            self.__protected_size -= self.__protected.pop(key)
+        else:
+            del self.__probation[key]
+            self.__candidates.pop(key, None)
+
+    def popitem(self) -> Any:
+        """Remove and return the loser of the TinyLFU admission contest."""
+        key = self.__choose_victim()
+        value = Cache.__getitem__(self, key)
+        del self[key]
+        return key, value
+
+    def __choose_victim(self) -> Hashable:
+        main_victim = next(
+            (k for k in self.__probation if k not in self.__candidates), _MISSING
+        )
+        if main_victim is _MISSING:
+            main_victim = next(iter(self.__protected), _MISSING)
+
+        if self.__candidates:
+            candidate = next(iter(self.__candidates))
+            if main_victim is _MISSING:
+                return candidate
+
+            # loser of the contest is evicted, a winning candidate joins the main region
+            del self.__candidates[candidate]
+            if self.__sketch.estimate(candidate) > self.__sketch.estimate(main_victim):
+                return main_victim
+            return candidate
+
+        if main_victim is not _MISSING:
+            return main_victim
+
+        try:
+            return next(iter(self.__window))
+        except StopIteration:
+            raise KeyError(f'{type(self).__name__} is empty') from None
+
+    def clear(self) -> None:
+        Cache.clear(self)
+        for region in (self.__window, self.__probation, self.__protected, self.__candidates):
+            region.clear()
+        self.__window_size = self.__protected_size = 0
+
+
+#: available eviction policies
+POLICIES: Dict[str, Type[Cache]] = {
+    'lru': LRUCache,
+    'lfu': LFUCache,
+    'lfu-aging': LFUAgingCache,
+    'tinylfu': WTinyLFUCache,
+}
+
+
+def make_cache(policy: str, maxsize: int, getsizeof: Callable = None) -> Cache:
+    """Create an empty cache with the given eviction policy"""
+    try:
+        cache_cls = POLICIES[policy]
+    except KeyError:
+        raise ValueError(
+            f'unknown cache policy {policy} (available: {", ".join(POLICIES)})'
+        ) from None
+    return cache_cls(maxsize, getsizeof)
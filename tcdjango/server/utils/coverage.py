@@ -0,0 +1,184 @@
+"""coverage.py
+
+Per-dataset bitmap of XYZ tiles that intersect valid data.
+"""
+
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import base64
+import threading
+
+import numpy as np
+import mercantile
+
+from django.conf import settings
+
+MAX_ZOOM = 22
+
+
+class CoverageIndex:
+    """Bitmap of the tiles at one zoom level that intersect a dataset's footprint.
+
+    Tiles at other zoom levels are answered through their ancestor or descendants at the
+    index zoom. The footprint (convex hull of valid data) is densified before projecting
+    it to web mercator, rasterized with all touched pixels and grown by one cell to absorb
+    the error of its own reprojection to WGS84, so the index never reports a tile with data
+    as empty.
+    """
+
+    def __init__(self, zoom: int, x: int, y: int, mask: np.ndarray):
+        self.zoom = zoom
+        self.x = x
+        self.y = y
+        self.mask = mask
+
+    @classmethod
+    def from_geometry(cls, footprint: Mapping[str, Any], bounds: Sequence[float],
+                      max_tiles: int) -> 'CoverageIndex':
+        """Build an index from a WGS84 GeoJSON footprint with given (w, s, e, n) bounds.
+
+        Uses the highest zoom level at which the bounds span at most max_tiles tiles.
+        """
+        from rasterio import features, transform, warp
+
+        west, south, east, north = bounds
+
+        zoom = MAX_ZOOM
+        while zoom > 0:
+            mintile = mercantile.tile(west, north, zoom)
+            maxtile = mercantile.tile(east, south, zoom)
+            num_tiles = (maxtile.x - mintile.x + 1) * (maxtile.y - mintile.y + 1)
+            if num_tiles <= max_tiles:
+                break
+            zoom -= 1
+
+        mintile = mercantile.tile(west, north, zoom)
+        maxtile = mercantile.tile(east, south, zoom)
+        width, height = maxtile.x - mintile.x + 1, maxtile.y - mintile.y + 1
+
+        grid_west, grid_north = mercantile.xy(*mercantile.ul(mintile))
+        grid_east, grid_south = mercantile.xy(*mercantile.ul(maxtile.x + 1, maxtile.y + 1, zoom))
+        grid_transform = transform.from_bounds(
+            grid_west, grid_south, grid_east, grid_north, width, height
+        )
+
+        # straight edges in WGS84 are curved in web mercator
+        cell_size = 360. / 2 ** zoom
+        footprint_mercator = warp.transform_geom(
+            'epsg:4326', 'epsg:3857', _densify(footprint, cell_size / 4)
+        )
+        mask = features.rasterize(
+            [(footprint_mercator, 1)], out_shape=(height, width), transform=grid_transform,
+            all_touched=True, fill=0, dtype='uint8'
+        ).astype('bool')
+
+        return cls(zoom, mintile.x, mintile.y, _dilate(mask))
+
+    def intersects(self, tile_x: int, tile_y: int, tile_z: int) -> bool:
+        """Return whether the given tile may contain valid data"""
+        height, width = self.mask.shape
+
+        if tile_z >= self.zoom:
+            shift = tile_z - self.zoom
+            col, row = (tile_x >> shift) - self.x, (tile_y >> shift) - self.y
+            if not (0 <= col < width and 0 <= row < height):
+                return False
+            return bool(self.mask[row, col])
+
+        # tile covers a block of index cells
+        shift = self.zoom - tile_z
+        col_start = max(0, (tile_x << shift) - self.x)
+        col_stop = min(width, ((tile_x + 1) << shift) - self.x)
+        row_start = max(0, (tile_y << shift) - self.y)
+        row_stop = min(height, ((tile_y + 1) << shift) - self.y)
+        return bool(self.mask[row_start:row_stop, col_start:col_stop].any())
+
+    def to_json(self) -> Dict[str, Any]:
+        height, width = self.mask.shape
+        return {
+            'zoom': self.zoom,
+            'x': self.x,
+            'y': self.y,
+            'width': width,
+            'height': height,
+            'bits': base64.b64encode(np.packbits(self.mask).tobytes()).decode('ascii')
+        }
+
+    @classmethod
+    def from_json(cls, data: Mapping[str, Any]) -> 'CoverageIndex':
+        bits = np.frombuffer(base64.b64decode(data['bits']), dtype='uint8')
+        num_cells = data['width'] * data['height']
+        mask = np.unpackbits(bits)[:num_cells].astype('bool').reshape(
+            data['height'], data['width']
+        )
+        return cls(data['zoom'], data['x'], data['y'], mask)
+
+
+def _densify_ring(ring: Sequence[Sequence[float]], step: float) -> List[List[float]]:
+    out = []
+    for (x0, y0), (x1, y1) in zip(ring[:-1], ring[1:]):
+        num_segments = max(1, int(np.ceil(max(abs(x1 - x0), abs(y1 - y0)) / step)))
+        for t in np.arange(num_segments) / num_segments:
+            out.append([x0 + t * (x1 - x0), y0 + t * (y1 - y0)])
+    out.append(list(ring[-1]))
+    return out
+
+
+def _densify(geom: Mapping[str, Any], step: float) -> Mapping[str, Any]:
+    """Insert vertices into the edges of a GeoJSON (multi)polygon, at most step apart"""
+    if geom['type'] == 'Polygon':
+        rings = [_densify_ring(ring, step) for ring in geom['coordinates']]
+        return {'type': 'Polygon', 'coordinates': rings}
+
+    if geom['type'] == 'MultiPolygon':
+        polygons = [
+            [_densify_ring(ring, step) for ring in polygon] for polygon in geom['coordinates']
+        ]
+        return {'type': 'MultiPolygon', 'coordinates': polygons}
+
+    return geom
+
+
+def _dilate(mask: np.ndarray) -> np.ndarray:
+    """Grow a boolean mask by one cell in every direction"""
+    height, width = mask.shape
+    padded = np.pad(mask, 1)
+    out = np.zeros_like(mask)
+    for row_offset in range(3):
+        for col_offset in range(3):
+            out |= padded[row_offset:row_offset + height, col_offset:col_offset + width]
+    return out
+
+
+# decoded indices by DatasetStats id
+_indices: Dict[int, Optional[CoverageIndex]] = {}
+_indices_lock = threading.Lock()
+
+
+def get_coverage_index(stats: Any) -> Optional[CoverageIndex]:
+    """Return the coverage index of the given DatasetStats, or None if it has none."""
+    with _indices_lock:
+        if stats.pk in _indices:
+            return _indices[stats.pk]
+
+    index = None
+    if stats.coverage is not None:
+        index = CoverageIndex.from_json(stats.coverage)
+
+    with _indices_lock:
+        _indices[stats.pk] = index
+
+    return index
+
+
+def forget_coverage_index(stats_id: int) -> None:
+    """Drop the decoded coverage index of the given DatasetStats id."""
+    with _indices_lock:
+        _indices.pop(stats_id, None)
+
+
+def build_coverage(footprint: Mapping[str, Any], bounds: Sequence[float]) -> Dict[str, Any]:
+    """Build the serialized coverage index stored on DatasetStats at ingestion."""
+    return CoverageIndex.from_geometry(
+        footprint, bounds, settings.COVERAGE_INDEX_MAX_TILES
+    ).to_json()
@@ -8,6 +8,14 @@ class TileOutOfBoundsError(Exception):
     pass
 
 
+class TileDeadlineExceeded(Exception):
+    pass
+
+
+class TileReadShedError(Exception):
+    pass
+
+
 class DatasetNotFoundError(Exception):
     pass
 
@@ -0,0 +1,229 @@
+"""executor.py
+
+Lazily created executor that runs tile reads.
+"""
+
+from typing import Any, Callable, Dict, Optional, Tuple
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import sys
+import logging
+import functools
+import threading
+
+from django.conf import settings
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# GDAL environment entered once per worker thread, kept open for the worker's lifetime
+# (rasterio environments are thread-local, so every thread of a pool needs its own)
+_worker_local = threading.local()
+
+
+def init_worker(gdal_config: Dict[str, Any]) -> None:
+    """Set up the GDAL environment of a worker process or thread."""
+    import rasterio
+    from server.utils.raster_base import RasterDriver
+
+    env = rasterio.Env(**dict(RasterDriver._RIO_ENV_KEYS, **gdal_config))
+    env.__enter__()
+    _worker_local.env = env
+
+
+def in_worker() -> bool:
+    """Return whether the calling thread is a tile worker with its GDAL environment set up."""
+    return getattr(_worker_local, 'env', None) is not None
+
+
+def _peak_rss() -> int:
+    if resource is None:  # pragma: no cover
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _run_measured(fn: Callable, *args: Any, **kwargs: Any) -> Tuple[Any, int]:
+    return fn(*args, **kwargs), _peak_rss()
+
+
+class WorkerPool(Executor):
+    """Process pool that replaces its workers after a number of tasks or a memory limit.
+
+    Recycling swaps in a fresh ProcessPoolExecutor, the old one finishes its queued tasks
+    and exits in the background. Workers report their peak resident memory with every
+    result, so a single worker above max_memory recycles the whole pool.
+    """
+
+    def __init__(self, max_workers: int, *, max_tasks: Optional[int] = None,
+                 max_memory: Optional[int] = None,
+                 initializer: Optional[Callable] = None, initargs: Tuple = ()):
+        self.max_workers = max_workers
+        self.max_tasks = max_tasks
+        self.max_memory = max_memory
+        self.recycled = 0
+        self._initializer = initializer
+        self._initargs = initargs
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._tasks = 0
+        self._memory_exceeded = False
+        self._shutdown = False
+        self._lock = threading.Lock()
+
+    def _needs_recycling(self) -> bool:
+        if self._memory_exceeded:
+            return True
+        # tasks are spread over all workers, recycle after max_tasks per worker on average
+        return self.max_tasks is not None and self._tasks >= self.max_tasks * self.max_workers
+
+    def _replace_pool(self) -> None:
+        old_pool = self._pool
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_workers, initializer=self._initializer,
+            initargs=self._initargs
+        )
+        self._tasks = 0
+        self._memory_exceeded = False
+
+        if old_pool is not None:
+            self.recycled += 1
+            old_pool.shutdown(wait=False)
+
+    def submit(self, fn: Callable, *args: Any, **kwargs: Any) -> Future:
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('cannot schedule new futures after shutdown')
+
+            if self._pool is None or self._needs_recycling():
+                self._replace_pool()
+
+            try:
+                inner = self._pool.submit(_run_measured, fn, *args, **kwargs)
+            except BrokenProcessPool:
+                # a worker died (e.g. killed by the OOM killer), start over
+                logger.warning('Tile worker pool broken, restarting it')
+                self._replace_pool()
+                inner = self._pool.submit(_run_measured, fn, *args, **kwargs)
+
+            self._tasks += 1
+
+        outer: Future = Future()
+        inner.add_done_callback(functools.partial(self._task_done, outer=outer))
+        return outer
+
+    def _task_done(self, inner: Future, outer: Future) -> None:
+        if inner.cancelled():
+            outer.cancel()
+            return
+
+        if not outer.set_running_or_notify_cancel():
+            return
+
+        exc = inner.exception()
+        if exc is not None:
+            outer.set_exception(exc)
+            return
+
+        result, peak_rss = inner.result()
+        if self.max_memory is not None and peak_rss > self.max_memory:
+            with self._lock:
+                self._memory_exceeded = True
+
+        outer.set_result(result)
+
+    def shutdown(self, wait: bool = True) -> None:  # type: ignore[override]
+        with self._lock:
+            self._shutdown = True
+            pool = self._pool
+
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'tasks': self._tasks,
+                'recycled': self.recycled
+            }
+
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+_thread_workers = 0
+
+
+def get_executor() -> Executor:
+    """Return the executor that runs tile reads, creating it on first use."""
+    global _executor, _thread_workers
+
+    with _executor_lock:
+        if _executor is not None:
+            return _executor
+
+        kind = settings.RASTER_EXECUTOR
+        initargs = (settings.RASTER_WORKER_GDAL_CONFIG,)
+
+        if kind == 'thread':
+            _thread_workers = settings.RASTER_EXECUTOR_WORKERS
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RASTER_EXECUTOR_WORKERS, initializer=init_worker,
+                initargs=initargs
+            )
+        elif kind == 'process':
+            _executor = WorkerPool(
+                settings.RASTER_EXECUTOR_WORKERS,
+                max_tasks=settings.RASTER_WORKER_MAX_TASKS,
+                max_memory=settings.RASTER_WORKER_MAX_MEMORY,
+                initializer=init_worker, initargs=initargs
+            )
+            try:
+                # this fails on architectures without /dev/shm
+                _executor.submit(int).result()
+            except OSError:
+                logger.warning('Cannot start tile worker processes, reading tiles serially')
+                # fall back to serial evaluation
+                _thread_workers = 1
+                _executor = ThreadPoolExecutor(
+                    max_workers=1, initializer=init_worker, initargs=initargs
+                )
+        else:
+            raise ValueError(f'unknown executor kind {kind}')
+
+        return _executor
+
+
+def reset_executor(wait: bool = True) -> None:
+    """Shut down the tile executor, the next read creates a new one from current settings."""
+    global _executor
+
+    with _executor_lock:
+        executor, _executor = _executor, None
+
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+def uses_processes() -> bool:
+    """Return whether tile reads run in separate processes."""
+    return isinstance(get_executor(), WorkerPool)
+
+
+def executor_info(executor: Optional[Executor] = None) -> Dict[str, Any]:
+    """Return kind and recycling statistics of the given executor, by default of the tile
+    executor. Does not start the tile executor, reports no workers until it is used."""
+    if executor is None:
+        with _executor_lock:
+            executor = _executor
+
+    if executor is None:
+        return {'workers': 0, 'kind': settings.RASTER_EXECUTOR}
+    if isinstance(executor, WorkerPool):
+        return dict(executor.info(), kind='process')
+    return {'workers': _thread_workers, 'kind': 'thread'}
@@ -0,0 +1,170 @@
+"""handles.py
+
+Pool of open raster dataset handles, reused across tile reads.
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+import os
+import threading
+import contextlib
+import collections
+
+from django.conf import settings
+
+if TYPE_CHECKING:  # pragma: no cover
+    from rasterio.io import DatasetReader  # noqa: F401
+
+Signature = Optional[Tuple[int, int]]
+
+
+def _file_signature(path: str) -> Signature:
+    """Return modification time and size of local files, None for remote ones"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class DatasetPool:
+    """Per-process LRU pool of open rasterio datasets keyed by path.
+
+    Datasets are checked out for exclusive use (rasterio handles are not thread-safe) and
+    returned afterwards, so concurrent reads of the same file get separate handles. At most
+    ``maxsize`` idle handles are kept open. Handles are dropped after a fork, and handles of
+    local files are reopened when the file changes on disk.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._idle: Dict[str, List[Tuple['DatasetReader', Signature]]] = (
+            collections.OrderedDict()
+        )
+        self._num_idle = 0
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    @contextlib.contextmanager
+    def open(self, path: str) -> Iterator['DatasetReader']:
+        """Check out an open dataset for the given path"""
+        from rasterio.errors import RasterioError
+
+        signature = _file_signature(path)
+        handle = self._checkout(path, signature)
+
+        reusable = True
+        try:
+            yield handle
+        except RasterioError:
+            # handle may be in a broken state
+            reusable = False
+            raise
+        finally:
+            if reusable:
+                self._checkin(path, handle, signature)
+            else:
+                handle.close()
+
+    def _checkout(self, path: str, signature: Signature) -> 'DatasetReader':
+        import rasterio
+
+        stale = []
+        handle = None
+
+        with self._lock:
+            self._check_fork()
+            candidates = self._idle.get(path, [])
+            while candidates:
+                candidate, candidate_signature = candidates.pop()
+                self._num_idle -= 1
+                if candidate_signature == signature:
+                    handle = candidate
+                    break
+                stale.append(candidate)
+
+            if not candidates:
+                self._idle.pop(path, None)
+
+            if handle is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        for candidate in stale:
+            candidate.close()
+
+        if handle is None:
+            handle = rasterio.open(path)
+
+        return handle
+
+    def _checkin(self, path: str, handle: 'DatasetReader', signature: Signature) -> None:
+        evicted = []
+
+        with self._lock:
+            self._check_fork()
+            if self.maxsize <= 0 or handle.closed:
+                evicted.append(handle)
+            else:
+                self._idle.setdefault(path, []).append((handle, signature))
+                self._idle.move_to_end(path)
+                self._num_idle += 1
+
+                while self._num_idle > self.maxsize:
+                    lru_path, handles = next(iter(self._idle.items()))
+                    evicted.append(handles.pop(0)[0])
+                    self._num_idle -= 1
+                    if not handles:
+                        del self._idle[lru_path]
+
+        for old_handle in evicted:
+            old_handle.close()
+
+    def _check_fork(self) -> None:
+        # GDAL handles must not be used across fork, just forget the parent's handles
+        if self._pid != os.getpid():
+            self._idle = collections.OrderedDict()
+            self._num_idle = 0
+            self._pid = os.getpid()
+
+    def invalidate(self, path: str) -> None:
+        """Close all idle handles of the given path"""
+        with self._lock:
+            handles = self._idle.pop(path, [])
+            self._num_idle -= len(handles)
+
+        for handle, _ in handles:
+            handle.close()
+
+    def info(self) -> Dict[str, int]:
+        """Return reuse counters and the number of idle handles"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'idle': self._num_idle,
+                'maxsize': self.maxsize
+            }
+
+
+_dataset_pool: Optional[DatasetPool] = None
+_dataset_pool_lock = threading.Lock()
+
+
+def get_dataset_pool() -> DatasetPool:
+    """Return the dataset handle pool of this process, creating it on first use."""
+    global _dataset_pool
+
+    with _dataset_pool_lock:
+        if _dataset_pool is None:
+            _dataset_pool = DatasetPool(settings.RASTER_HANDLE_POOL_SIZE)
+        return _dataset_pool
+
+
+def invalidate(path: Any) -> None:
+    """Drop pooled handles of the given path in this process (if a pool exists)."""
+    if _dataset_pool is not None:
+        _dataset_pool.invalidate(str(path))
@@ -3,16 +3,20 @@
 Utilities to create and manipulate images.
 """
 
-from typing import Sequence, Tuple, TypeVar, Union
+from typing import Sequence, Tuple, TypeVar, Union, Optional, Any, Dict
 from typing.io import BinaryIO
 
 from io import BytesIO
 
+import functools
+import threading
+
 import numpy as np
 from PIL import Image
 
 from server.utils.profile import trace
 from server.utils import exceptions
+from server.utils.cache import ByteLRUCache
 from django.conf import settings
 
 Number = TypeVar('Number', int, float)
@@ -20,6 +24,93 @@ RGBA = Tuple[Number, Number, Number, Number]
 Palette = Sequence[RGBA]
 Array = TypeVar('Array', np.ndarray, np.ma.MaskedArray)
 
+# encoded PNGs, shared by all views and threads of a process
+_png_cache: Optional[ByteLRUCache] = None
+_png_cache_lock = threading.Lock()
+
+
+def _get_png_cache() -> ByteLRUCache:
+    from server.utils.raster_base import get_memory_budget
+
+    global _png_cache
+
+    with _png_cache_lock:
+        if _png_cache is None:
+            _png_cache = ByteLRUCache(settings.PNG_CACHE_SIZE)
+            budget = get_memory_budget()
+            if budget is not None:
+                budget.register(_png_cache, settings.PNG_CACHE_PRIORITY)
+
+        return _png_cache
+
+
+def png_cache_key(datasets: Sequence[Any], tile_xyz: Tuple[int, int, int], *,
+                  colormap: Optional[str], stretch_ranges: Sequence[Sequence[Number]],
+                  tile_size: Sequence[int]) -> Tuple:
+    """Build a key that uniquely identifies a rendered PNG tile"""
+    return (
+        tuple((dataset.pk, dataset.filepath.name) for dataset in datasets),
+        tuple(tile_xyz),
+        colormap,
+        tuple(tuple(float(v) for v in stretch_range) for stretch_range in stretch_ranges),
+        tuple(tile_size),
+        settings.PNG_COMPRESS_LEVEL,
+        # persisted PNGs must not outlive a change of how tiles are read
+        settings.REPROJECTION_METHOD,
+        settings.RESAMPLING_METHOD
+    )
+
+
+def get_cached_png(key: Tuple) -> Optional[bytes]:
+    """Return a previously rendered PNG, or None if it is not cached"""
+    from server.utils.raster_base import get_disk_cache
+
+    try:
+        return _get_png_cache()[key]
+    except KeyError:
+        pass
+
+    disk_cache = get_disk_cache()
+    if disk_cache is None or not settings.DISK_CACHE_PNG:
+        return None
+
+    try:
+        png_bytes = disk_cache[('png', key)]
+    except KeyError:
+        return None
+
+    _cache_png_bytes(key, png_bytes)
+    return png_bytes
+
+
+def cache_png(key: Tuple, png: BinaryIO) -> bytes:
+    """Insert a rendered PNG into the cache and return its contents"""
+    from server.utils.raster_base import get_disk_cache
+
+    png_bytes = png.getvalue()
+    _cache_png_bytes(key, png_bytes)
+
+    disk_cache = get_disk_cache()
+    if disk_cache is not None and settings.DISK_CACHE_PNG:
+        try:
+            disk_cache[('png', key)] = png_bytes
+        except ValueError:  # value too large
+            pass
+
+    return png_bytes
+
+
+def _cache_png_bytes(key: Tuple, png_bytes: bytes) -> None:
+    try:
+        _get_png_cache()[key] = png_bytes
+    except ValueError:  # value too large
+        pass
+
+
+def png_cache_info() -> Dict[str, int]:
+    """Return statistics of the rendered PNG cache"""
+    return _get_png_cache().info()
+
 
 @trace('array_to_png')
 def array_to_png(img_data: Array,
@@ -113,7 +204,7 @@ def array_to_png(img_data: Array,
 
 def empty_image(size: Tuple[int, int]) -> BinaryIO:
     """Return a fully transparent PNG image of given size"""
-    compress_level = PNG_COMPRESS_LEVEL
+    compress_level = settings.PNG_COMPRESS_LEVEL
 
     img = Image.new(mode='P', size=size, color=0)
 
@@ -123,6 +214,12 @@ def empty_image(size: Tuple[int, int]) -> BinaryIO:
     return sio
 
 
+@functools.lru_cache(maxsize=16)
+def empty_png(size: Tuple[int, int]) -> bytes:
+    """Return the encoded fully transparent PNG of given size, shared by all empty tiles"""
+    return empty_image(tuple(size)).getvalue()
+
+
 @trace('contrast_stretch')
 def contrast_stretch(data: Array,
                      in_range: Sequence[Number],
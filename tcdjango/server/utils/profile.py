@@ -3,27 +3,51 @@
 Decorators for performance tracing.
 """
 
-from typing import Iterator
+from typing import Dict, Iterator, List
 
+import time
+import threading
 import traceback
 import contextlib
+import collections
 
 from django.conf import settings
 
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def record_timings() -> Iterator[Dict[str, List[float]]]:
+    """Collect wall-clock durations (in seconds) of all traced stages run by this thread"""
+    timings: Dict[str, List[float]] = collections.defaultdict(list)
+    previous = getattr(_local, 'timings', None)
+    _local.timings = timings
+    try:
+        yield timings
+    finally:
+        _local.timings = previous
+
 
 @contextlib.contextmanager
 def trace(description: str) -> Iterator:
+    timings = getattr(_local, 'timings', None)
+    if timings is not None:
+        start = time.perf_counter()
 
-    if settings.XRAY_PROFILE:
-        from aws_xray_sdk.core import xray_recorder
-        try:
-            subsegment = xray_recorder.begin_subsegment(description)
-            yield subsegment
-        except Exception as exc:
-            stack = traceback.extract_stack()
-            subsegment.add_exception(exc, stack)
-            raise
-        finally:
-            xray_recorder.end_subsegment()
-    else:
-        yield
+    try:
+        if settings.XRAY_PROFILE:
+            from aws_xray_sdk.core import xray_recorder
+            try:
+                subsegment = xray_recorder.begin_subsegment(description)
+                yield subsegment
+            except Exception as exc:
+                stack = traceback.extract_stack()
+                subsegment.add_exception(exc, stack)
+                raise
+            finally:
+                xray_recorder.end_subsegment()
+        else:
+            yield
+    finally:
+        if timings is not None:
+            timings[description].append(time.perf_counter() - start)
@@ -1,11 +1,13 @@
-from typing import (Callable, Any, Union, Mapping, Sequence, Dict, List, Tuple,
-                    TypeVar, Optional, cast, TYPE_CHECKING)
+from typing import (Callable, Any, Union, Mapping, Sequence, Dict, Iterator, List, Tuple,
+                    TypeVar, NamedTuple, Optional, cast, TYPE_CHECKING)
 from abc import ABC, abstractmethod
-from concurrent.futures import Future, Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import Future
 from django.conf import settings
 from server.utils.profile import trace
 from server.utils import exceptions
 
+import os
+import queue
 import contextlib
 import functools
 import logging
@@ -25,20 +27,417 @@ try:
 except ImportError:  # pragma: no cover
     has_crick = False
 
-from server.utils.cache import CompressedLFUCache
+from server.utils import admission, transfer
+from server.utils.batching import ReadBatcher
+from server.utils.executor import get_executor, in_worker, uses_processes
+from server.utils.scheduler import (Priority, PriorityScheduler, current_scheduler,
+                                    deadline_for, get_scheduler)
+from server.utils.handles import get_dataset_pool
+from server.utils.cache import (ShardedCache, SharedMemoryCache, SQLiteCache, MemoryBudget,
+                                compress_ma, decompress_tuple, pack_tuple, unpack_tuple,
+                                key_digest)
 
 Number = TypeVar('Number', int, float)
 
 logger = logging.getLogger(__name__)
 
-executor: Executor
+# one line per tile lookup, for replaying traffic against cache policies (replay_cache_log)
+access_logger = logging.getLogger('server.tile_access')
+
+# shared by all RasterDriver instances (and thus all views and threads) of a process,
+# _cache_lock only guards their creation
+_raster_cache: Optional[ShardedCache] = None
+_shared_cache: Optional[SharedMemoryCache] = None
+_disk_cache: Optional[SQLiteCache] = None
+_memory_budget: Optional[MemoryBudget] = None
+_cache_lock = threading.RLock()
+
+
+# in-flight tile reads by cache key, so concurrent misses for the same tile share one read
+_inflight: Dict[Any, Future] = {}
+_inflight_lock = threading.Lock()
+_read_counters = {
+    'submitted': 0, 'coalesced': 0, 'prefetched': 0, 'prefetch_dropped': 0, 'fill_dropped': 0
+}
+
+# cache fills of finished reads, run by a writer thread of this process
+_cache_fills: Optional[queue.Queue] = None
+_cache_fills_pid: Optional[int] = None
+
+# groups reads of the same file into one task, see RASTER_BATCH_WINDOW
+_read_batcher: Optional[ReadBatcher] = None
+
+
+# alpha of fully opaque pixels by data type of the alpha band, 255 for all others
+_ALPHA_MAX = {'uint16': 65535, 'int16': 32767}
+
+
+class RasterGeometry(NamedTuple):
+    """Dataset properties computed at ingestion that tile reads would otherwise derive"""
+    bounds: Tuple[float, float, float, float]  # in target CRS
+    resolution: Tuple[float, float]  # suggested resolution in target CRS
+    crs: str
+    dtype: str
+    nodata: Optional[float]
+
+
+# reprojection geometry of ingested datasets by raster path, filled from DatasetStats
+_geometry_registry: Dict[str, RasterGeometry] = {}
+_geometry_lock = threading.Lock()
+
+
+def get_raster_geometry(dataset: Any, path: str) -> Optional[RasterGeometry]:
+    """Return precomputed geometry of the given dataset, or None if it was not stored."""
+    with _geometry_lock:
+        geometry = _geometry_registry.get(path)
+
+    if geometry is not None:
+        return geometry
+
+    stats = dataset.stats
+    if stats.mercator_bounds is None or stats.mercator_resolution is None:
+        # ingested before geometry was recorded
+        return None
+
+    geometry = RasterGeometry(
+        bounds=tuple(stats.mercator_bounds),
+        resolution=tuple(stats.mercator_resolution),
+        crs=stats.crs,
+        dtype=stats.dtype,
+        nodata=stats.nodata
+    )
+
+    with _geometry_lock:
+        _geometry_registry[path] = geometry
+
+    return geometry
+
+
+def forget_raster_geometry(path: str) -> None:
+    """Drop registered geometry of the given raster path."""
+    with _geometry_lock:
+        _geometry_registry.pop(path, None)
+
+
+def get_memory_budget() -> Optional[MemoryBudget]:
+    """Return the byte budget shared by all in-memory caches, or None if it is disabled."""
+    global _memory_budget
+
+    if settings.CACHE_MEMORY_BUDGET is None:
+        return None
+
+    with _cache_lock:
+        if _memory_budget is None:
+            _memory_budget = MemoryBudget(settings.CACHE_MEMORY_BUDGET)
+        return _memory_budget
+
+
+def get_raster_cache() -> ShardedCache:
+    """Return the process-wide raster tile cache, creating it on first use."""
+    global _raster_cache
+
+    with _cache_lock:
+        if _raster_cache is None:
+            _raster_cache = ShardedCache(
+                settings.RASTER_CACHE_SIZE,
+                compression_level=settings.RASTER_CACHE_COMPRESS_LEVEL,
+                codec=settings.RASTER_CACHE_CODEC,
+                shuffle=settings.RASTER_CACHE_SHUFFLE,
+                num_shards=settings.RASTER_CACHE_SHARDS,
+                policy=settings.RASTER_CACHE_POLICY
+            )
+            budget = get_memory_budget()
+            if budget is not None:
+                budget.register(_raster_cache, settings.RASTER_CACHE_PRIORITY)
+        return _raster_cache
+
+
+def get_shared_cache() -> Optional[SharedMemoryCache]:
+    """Return the host-wide shared memory tile cache, or None if it is disabled."""
+    global _shared_cache
+
+    if settings.RASTER_SHARED_CACHE_PATH is None:
+        return None
+
+    with _cache_lock:
+        if _shared_cache is None:
+            _shared_cache = SharedMemoryCache(
+                settings.RASTER_SHARED_CACHE_PATH,
+                settings.RASTER_SHARED_CACHE_SIZE,
+                slot_size=settings.RASTER_SHARED_CACHE_SLOT_SIZE,
+                compression_level=settings.RASTER_CACHE_COMPRESS_LEVEL,
+                codec=settings.RASTER_CACHE_CODEC,
+                shuffle=settings.RASTER_CACHE_SHUFFLE
+            )
+        return _shared_cache
+
+
+def get_disk_cache() -> Optional[SQLiteCache]:
+    """Return the persistent on-disk tile cache, or None if it is disabled."""
+    global _disk_cache
+
+    if settings.DISK_CACHE_PATH is None:
+        return None
+
+    with _cache_lock:
+        if _disk_cache is None:
+            _disk_cache = SQLiteCache(settings.DISK_CACHE_PATH, settings.DISK_CACHE_SIZE)
+        return _disk_cache
+
+
+def cache_info() -> Dict[str, Any]:
+    """Return statistics of the raster tile caches."""
+    info = get_raster_cache().info()
+
+    shared_cache = get_shared_cache()
+    if shared_cache is not None:
+        info['shared'] = shared_cache.info()
+
+    disk_cache = get_disk_cache()
+    if disk_cache is not None:
+        info['disk'] = disk_cache.info()
+
+    budget = get_memory_budget()
+    if budget is not None:
+        info['budget'] = budget.info()
+
+    return info
+
+
+def read_info() -> Dict[str, Any]:
+    """Return counters of submitted, coalesced, prefetched, batched and scheduled reads."""
+    with _inflight_lock:
+        info: Dict[str, Any] = dict(_read_counters, in_flight=len(_inflight))
+
+    # without scheduler, report empty counters instead of starting the executor
+    scheduler = current_scheduler() or PriorityScheduler(0)
+    info['scheduler'] = scheduler.info()
+
+    read_batcher = get_read_batcher()
+    if read_batcher is not None:
+        info['batching'] = read_batcher.info()
+
+    cache_fills = _cache_fills
+    info['fill_pending'] = cache_fills.qsize() if cache_fills is not None else 0
+
+    return info
+
+
+def raster_path(dataset: Any) -> str:
+    """Return the path GDAL opens for the given dataset."""
+    if settings.USE_S3_RASTERS:
+        return dataset.filepath.url
+    return dataset.filepath.path
+
+
+def tile_read_kwargs(path: str, *, tile_bounds: Optional[Sequence[float]],
+                     tile_size: Sequence[int], preserve_values: bool) -> Dict[str, Any]:
+    """Return the arguments of a tile read, which also make up its cache key."""
+    # make sure all arguments are hashable
+    return dict(
+        path=path,
+        tile_bounds=tuple(tile_bounds) if tile_bounds else None,
+        tile_size=tuple(tile_size),
+        preserve_values=preserve_values,
+        reprojection_method=settings.REPROJECTION_METHOD,
+        resampling_method=settings.RESAMPLING_METHOD
+    )
+
+
+def _start_read(retrieve: Callable[[], Any]) -> Future:
+    threshold = transfer.shared_memory_threshold(
+        uses_processes(), settings.RASTER_SHARED_MEMORY_THRESHOLD
+    )
+    if threshold is None:
+        return get_executor().submit(retrieve)
+
+    # large results come back through shared memory instead of the result pipe
+    worker_future = get_executor().submit(transfer.run_exporting, retrieve, threshold)
+    future: Future = Future()
+    worker_future.add_done_callback(functools.partial(transfer.chain_import, outer=future))
+    return future
+
+
+def _run_in_executor(retrieve: Callable[[], Any], priority: Priority,
+                     deadline: Optional[float], future: Future = None) -> Future:
+    return get_scheduler().submit(
+        functools.partial(_start_read, retrieve), priority=priority, deadline=deadline,
+        future=future
+    )
+
+
+def _dispatch_batch(path: str, items: List[Tuple[Any, ...]]) -> Future:
+    # all reads of a path share its geometry
+    requests = [
+        {k: v for k, v in kwargs.items() if k != 'path'} for kwargs, *_ in items
+    ]
+    geometry = items[0][1]
+
+    # batch runs as early and as long as its most urgent read needs
+    priority = min(item[2] for item in items)
+    deadlines = [item[3] for item in items]
+    deadline = None if None in deadlines else max(deadlines)
+
+    return _run_in_executor(functools.partial(
+        RasterDriver._get_raster_tiles, path, requests, geometry=geometry
+    ), priority, deadline)
+
+
+def get_read_batcher() -> Optional[ReadBatcher]:
+    """Return the batcher of tile reads, or None if reads are not batched."""
+    global _read_batcher
+
+    if settings.RASTER_BATCH_WINDOW is None:
+        return None
+
+    with _cache_lock:
+        if _read_batcher is None:
+            _read_batcher = ReadBatcher(
+                _dispatch_batch, window=settings.RASTER_BATCH_WINDOW,
+                max_size=settings.RASTER_BATCH_MAX_SIZE
+            )
+        return _read_batcher
+
+
+def submit_read(key: Any, retrieve: Callable[[], Any], *,
+                batch: Tuple[Dict[str, Any], Optional[RasterGeometry]] = None,
+                priority: Priority = Priority.INTERACTIVE,
+                deadline: Optional[float] = None) -> Tuple[Future, bool]:
+    """Schedule a read unless an identical one is in flight.
+
+    Single tile reads also pass their read arguments and geometry as batch, so they can
+    be grouped with other reads of the same file instead of running retrieve. Reads still
+    queued after the deadline (in time.monotonic) fail with TileDeadlineExceeded.
+
+    Returns the future of the read and whether the caller owns it (and thus has to
+    release it through release_read once done).
+    """
+    # created on first use, outside the lock (starting workers takes a while)
+    get_executor()
+    read_batcher = get_read_batcher() if batch is not None else None
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is not None:
+            # identical read already running, share its result
+            _read_counters['coalesced'] += 1
+            get_scheduler().promote(future, priority, deadline)
+            return future, False
+
+        future = Future()
+        _inflight[key] = future
+        _read_counters['submitted'] += 1
+
+    # submit only after releasing the lock: submitting may resolve futures of other reads
+    # in this thread, and their callbacks take _inflight_lock to release them
+    try:
+        if read_batcher is not None:
+            read_batcher.submit(
+                batch[0]['path'], (*batch, priority, deadline), future=future
+            )
+        else:
+            _run_in_executor(retrieve, priority, deadline, future=future)
+    except Exception as exc:
+        if future.set_running_or_notify_cancel():
+            future.set_exception(exc)
+
+    return future, True
+
+
+def release_read(key: Any, future: Future) -> None:
+    """Stop sharing a read returned by submit_read, later reads of the key start anew."""
+    with _inflight_lock:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+
+
+def _get_cache_fills() -> queue.Queue:
+    global _cache_fills, _cache_fills_pid
+
+    with _cache_lock:
+        # writer thread does not survive forking
+        if _cache_fills is None or _cache_fills_pid != os.getpid():
+            _cache_fills = queue.Queue(maxsize=settings.RASTER_CACHE_WRITE_QUEUE)
+            _cache_fills_pid = os.getpid()
+            thread = threading.Thread(
+                target=_run_cache_fills, args=(_cache_fills,), name='tile-cache-writer'
+            )
+            thread.daemon = True
+            thread.start()
+        return _cache_fills
+
+
+def _run_cache_fills(cache_fills: queue.Queue) -> None:
+    while True:
+        fill, release = cache_fills.get()
+        try:
+            fill()
+        except Exception:
+            logger.exception('Failed to write tile to cache')
+        finally:
+            release()
+
+
+def fill_cache_later(fill: Callable[[], None], release: Callable[[], None]) -> None:
+    """Fill tile caches on the cache writer thread, then release the read they belong to.
+
+    Compression and cache I/O thus never hold up the thread that delivers read results.
+    While RASTER_CACHE_WRITE_QUEUE fills are pending, the read is released uncached.
+    """
+    try:
+        _get_cache_fills().put_nowait((fill, release))
+    except queue.Full:
+        with _inflight_lock:
+            _read_counters['fill_dropped'] += 1
+        release()
+
+
+def metatile_block(tile_xyz: Tuple[int, int, int], size: int) -> List[Tuple[int, int, int]]:
+    """Return the aligned block of up to size x size XYZ tiles containing the given tile.
+
+    Tiles are ordered row by row. Blocks are clipped at the edges of the tile grid.
+    """
+    tile_x, tile_y, tile_z = tile_xyz
+    num_tiles = 2 ** tile_z
+    x_start, y_start = tile_x - tile_x % size, tile_y - tile_y % size
+    return [
+        (x, y, tile_z)
+        for y in range(y_start, min(y_start + size, num_tiles))
+        for x in range(x_start, min(x_start + size, num_tiles))
+    ]
+
+
+class MetatileRead(NamedTuple):
+    """Read of the block of tiles a requested tile is cut from"""
+    key: Any  # in-flight key of the block read
+    kwargs: Dict[str, Any]  # read arguments of the whole block
+    shape: Tuple[int, int]  # tiles per column and row
+    tile_keys: List[Any]  # cache keys of all tiles of the block
+    tile_index: int  # position of the requested tile in the block
+
+
+def metatile_read(tile_xyz: Tuple[int, int, int], kwargs: Dict[str, Any]) -> MetatileRead:
+    """Return the block read of the given tile with given tile read arguments."""
+    import mercantile
+
+    block = metatile_block(tile_xyz, settings.RASTER_METATILE_SIZE)
+    block_shape = (
+        len(set(tile[1] for tile in block)), len(set(tile[0] for tile in block))
+    )
+
+    tile_bounds = [tuple(mercantile.xy_bounds(*tile)) for tile in block]
+    # sub-tiles get the same cache keys as if they were read one by one
+    tile_keys = [
+        cachetools.keys.hashkey(**dict(kwargs, tile_bounds=bounds))
+        for bounds in tile_bounds
+    ]
+    block_kwargs = dict(kwargs, tile_bounds=tuple(tile_bounds))
+    block_key = cachetools.keys.hashkey('metatile', block_shape, **block_kwargs)
+
+    return MetatileRead(
+        block_key, block_kwargs, block_shape, tile_keys, block.index(tuple(tile_xyz))
+    )
 
-try:
-    # this fails on architectures without /dev/shm
-    executor = ProcessPoolExecutor(max_workers=3)
-except OSError:
-    # fall back to serial evaluation
-    executor = ThreadPoolExecutor(max_workers=1)
 
 class RasterDriver():
     _TARGET_CRS: str = 'epsg:3857'
@@ -50,11 +449,7 @@ class RasterDriver():
 
     @abstractmethod
     def __init__(self, *args: Any, **kwargs: Any) -> None:
-        self._raster_cache = CompressedLFUCache(
-            settings.RASTER_CACHE_SIZE,
-            compression_level=settings.RASTER_CACHE_COMPRESS_LEVEL
-        )
-        self._cache_lock = threading.RLock()
+        self._raster_cache = get_raster_cache()
         super().__init__(*args, **kwargs)
 
     @staticmethod
@@ -234,6 +629,7 @@ class RasterDriver():
         import rasterio
         from rasterio import warp
         from .cog import validate
+        from .coverage import build_coverage
 
         row_data: Dict[str, Any] = {}
         ### extra metadata added to Dataset model
@@ -265,6 +661,9 @@ class RasterDriver():
                     src.crs, 'epsg:4326', *src.bounds, densify_pts=21
                 )
 
+                # geometry needed to read tiles, computed exactly as in _get_raster_tile
+                geometry = cls._compute_geometry(src)
+
                 if use_chunks is None and max_shape is None:
                     use_chunks = src.width * src.height > RasterDriver._LARGE_RASTER_THRESHOLD
 
@@ -293,6 +692,12 @@ class RasterDriver():
         row_data.update(raster_stats)
 
         row_data['bounds'] = bounds
+        row_data['mercator_bounds'] = geometry.bounds
+        row_data['mercator_resolution'] = geometry.resolution
+        row_data['crs'] = geometry.crs
+        row_data['dtype'] = geometry.dtype
+        row_data['nodata'] = geometry.nodata
+        row_data['coverage'] = build_coverage(row_data['convex_hull'], bounds)
         #row_data['metadata'] = extra_metadata
 
         return row_data
@@ -323,6 +728,63 @@ class RasterDriver():
             or ColorInterp.alpha in src.colorinterp
         )
 
+    @staticmethod
+    def _alpha_mask(alpha: np.ndarray, resampling_enum: Any) -> np.ndarray:
+        """Return invalid mask from an alpha band read along with the data"""
+        from rasterio.enums import Resampling
+
+        if resampling_enum == Resampling.nearest:
+            return alpha == 0
+
+        # resampled alpha blends in invalid source pixels, only fully opaque ones are valid
+        # (GDAL's default DST_ALPHA_MAX for the alpha band's data type)
+        return alpha < _ALPHA_MAX.get(alpha.dtype.name, 255)
+
+    @classmethod
+    def _compute_geometry(cls, src: 'DatasetReader') -> RasterGeometry:
+        from rasterio import warp
+
+        # compute bounds in target CRS
+        dst_bounds = warp.transform_bounds(src.crs, cls._TARGET_CRS, *src.bounds)
+
+        # compute suggested resolution in target CRS
+        dst_transform, _, _ = warp.calculate_default_transform(
+            src.crs, cls._TARGET_CRS, src.width, src.height, *src.bounds
+        )
+        dst_res = (abs(dst_transform.a), abs(dst_transform.e))
+
+        return RasterGeometry(
+            bounds=dst_bounds,
+            resolution=dst_res,
+            crs=src.crs.to_string(),
+            dtype=src.dtypes[0],
+            nodata=src.nodata
+        )
+
+    @staticmethod
+    @functools.lru_cache(maxsize=128)
+    def _is_target_crs(crs: str) -> bool:
+        from rasterio.crs import CRS
+        return CRS.from_user_input(crs) == CRS.from_user_input(RasterDriver._TARGET_CRS)
+
+    @classmethod
+    @contextlib.contextmanager
+    def _open_raster(cls, path: str) -> Iterator['DatasetReader']:
+        """Check out an open dataset for the given path from the handle pool"""
+        import rasterio
+
+        with contextlib.ExitStack() as es:
+            if not in_worker():
+                # tile workers enter their environment once, at startup
+                es.enter_context(rasterio.Env(**cls._RIO_ENV_KEYS))
+            try:
+                with trace('open_dataset'):
+                    src = es.enter_context(get_dataset_pool().open(path))
+            except OSError:
+                raise IOError('error while reading file {}'.format(path))
+
+            yield src
+
     @classmethod
     @trace('get_raster_tile')
     def _get_raster_tile(cls, path: str, *,
@@ -330,15 +792,46 @@ class RasterDriver():
                         resampling_method: str,
                         tile_bounds: Tuple[float, float, float, float] = None,
                         tile_size: Tuple[int, int] = (256, 256),
-                        preserve_values: bool = False) -> np.ma.MaskedArray:
+                        preserve_values: bool = False,
+                        geometry: RasterGeometry = None) -> np.ma.MaskedArray:
         """Load a raster dataset from a file through rasterio.
 
         Heavily inspired by mapbox/rio-tiler
         """
-        import rasterio
-        from rasterio import transform, windows, warp
-        from rasterio.vrt import WarpedVRT
-        from affine import Affine
+        with cls._open_raster(path) as src:
+            return cls._read_tile(
+                src, reprojection_method=reprojection_method,
+                resampling_method=resampling_method, tile_bounds=tile_bounds,
+                tile_size=tile_size, preserve_values=preserve_values, geometry=geometry
+            )
+
+    @classmethod
+    @trace('get_raster_tiles')
+    def _get_raster_tiles(cls, path: str, requests: Sequence[Dict[str, Any]],
+                          geometry: RasterGeometry = None) -> List[Any]:
+        """Read several tiles of the same file with one dataset handle.
+
+        Takes keyword arguments of _get_raster_tile (without path) for every tile. Returns
+        the tile, or the TileOutOfBoundsError raised for it, in request order.
+        """
+        out: List[Any] = []
+        with cls._open_raster(path) as src:
+            for request in requests:
+                try:
+                    out.append(cls._read_tile(src, geometry=geometry, **request))
+                except exceptions.TileOutOfBoundsError as exc:
+                    out.append(exc)
+        return out
+
+    @classmethod
+    def _read_tile(cls, src: 'DatasetReader', *,
+                   reprojection_method: str,
+                   resampling_method: str,
+                   tile_bounds: Tuple[float, float, float, float] = None,
+                   tile_size: Tuple[int, int] = (256, 256),
+                   preserve_values: bool = False,
+                   geometry: RasterGeometry = None) -> np.ma.MaskedArray:
+        from rasterio import transform
 
         dst_bounds: Tuple[float, float, float, float]
 
@@ -348,119 +841,242 @@ class RasterDriver():
             reproject_enum = cls._get_resampling_enum(reprojection_method)
             resampling_enum = cls._get_resampling_enum(resampling_method)
 
-        with contextlib.ExitStack() as es:
-            es.enter_context(rasterio.Env(**cls._RIO_ENV_KEYS))
-            try:
-                with trace('open_dataset'):
-                    src = es.enter_context(rasterio.open(path))
-            except OSError:
-                raise IOError('error while reading file {}'.format(path))
+        if geometry is None:
+            with trace('compute_geometry'):
+                geometry = cls._compute_geometry(src)
 
-            # compute buonds in target CRS
-            dst_bounds = warp.transform_bounds(src.crs, cls._TARGET_CRS, *src.bounds)
+        dst_bounds = geometry.bounds
 
-            if tile_bounds is None:
-                tile_bounds = dst_bounds
+        if tile_bounds is None:
+            tile_bounds = dst_bounds
 
-            # prevent loads of very sparse data
-            cover_ratio = (
-                (dst_bounds[2] - dst_bounds[0]) / (tile_bounds[2] - tile_bounds[0])
-                * (dst_bounds[3] - dst_bounds[1]) / (tile_bounds[3] - tile_bounds[1])
-            )
+        # prevent loads of very sparse data
+        cover_ratio = (
+            (dst_bounds[2] - dst_bounds[0]) / (tile_bounds[2] - tile_bounds[0])
+            * (dst_bounds[3] - dst_bounds[1]) / (tile_bounds[3] - tile_bounds[1])
+        )
 
-            if cover_ratio < 0.01:
-                raise exceptions.TileOutOfBoundsError('dataset covers less than 1% of tile')
+        if cover_ratio < 0.01:
+            raise exceptions.TileOutOfBoundsError('dataset covers less than 1% of tile')
 
-            # compute suggested resolution in target CRS
-            dst_transform, _, _ = warp.calculate_default_transform(
-                src.crs, cls._TARGET_CRS, src.width, src.height, *src.bounds
-            )
-            dst_res = (abs(dst_transform.a), abs(dst_transform.e))
+        dst_res = geometry.resolution
 
-            # make sure VRT resolves the entire tile
-            tile_transform = transform.from_bounds(*tile_bounds, *tile_size)
-            tile_res = (abs(tile_transform.a), abs(tile_transform.e))
+        # make sure VRT resolves the entire tile
+        tile_transform = transform.from_bounds(
+            *tile_bounds, width=tile_size[1], height=tile_size[0]
+        )
+        tile_res = (abs(tile_transform.a), abs(tile_transform.e))
+
+        if tile_res[0] < dst_res[0] or tile_res[1] < dst_res[1]:
+            dst_res = tile_res
+            resampling_enum = cls._get_resampling_enum('nearest')
+
+        # rasters already in target CRS (e.g. from optimize_rasters --reproject)
+        # can be read directly and let GDAL pick the overview
+        is_aligned = (
+            settings.RASTER_DIRECT_READ
+            and cls._is_target_crs(geometry.crs)
+            and src.transform.b == src.transform.d == 0
+        )
 
-            if tile_res[0] < dst_res[0] or tile_res[1] < dst_res[1]:
-                dst_res = tile_res
-                resampling_enum = cls._get_resampling_enum('nearest')
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', message='invalid value encountered.*')
+            if is_aligned:
+                with trace('read_direct'):
+                    tile_data, mask = cls._read_direct(
+                        src, tile_bounds, tile_size, resampling_enum
+                    )
+            else:
+                with trace('read_warped'):
+                    tile_data, mask = cls._read_warped(
+                        src, tile_bounds, tile_size, dst_res, reproject_enum,
+                        resampling_enum
+                    )
 
-            # pad tile bounds to prevent interpolation artefacts
-            num_pad_pixels = 2
+        if src.nodata is not None:
+            mask |= tile_data == src.nodata
 
-            # compute tile VRT shape and transform
-            dst_width = max(1, round((tile_bounds[2] - tile_bounds[0]) / dst_res[0]))
-            dst_height = max(1, round((tile_bounds[3] - tile_bounds[1]) / dst_res[1]))
-            vrt_transform = (
-                transform.from_bounds(*tile_bounds, width=dst_width, height=dst_height)
-                * Affine.translation(-num_pad_pixels, -num_pad_pixels)
-            )
-            vrt_height, vrt_width = dst_height + 2 * num_pad_pixels, dst_width + 2 * num_pad_pixels
+        return np.ma.masked_array(tile_data, mask=mask)
 
-            # remove padding in output
-            out_window = windows.Window(
-                col_off=num_pad_pixels, row_off=num_pad_pixels, width=dst_width, height=dst_height
-            )
+    @classmethod
+    def _read_warped(cls, src: 'DatasetReader',
+                     tile_bounds: Tuple[float, float, float, float],
+                     tile_size: Tuple[int, int],
+                     dst_res: Tuple[float, float],
+                     reproject_enum: Any,
+                     resampling_enum: Any) -> Tuple[np.ndarray, np.ndarray]:
+        """Read a tile through a WarpedVRT in target CRS, returns data and invalid mask"""
+        from rasterio import transform, windows
+        from rasterio.vrt import WarpedVRT
+        from affine import Affine
+
+        # pad tile bounds to prevent interpolation artefacts
+        num_pad_pixels = 2
 
-            # construct VRT
-            vrt = es.enter_context(
-                WarpedVRT(
+        # compute tile VRT shape and transform
+        dst_width = max(1, round((tile_bounds[2] - tile_bounds[0]) / dst_res[0]))
+        dst_height = max(1, round((tile_bounds[3] - tile_bounds[1]) / dst_res[1]))
+        vrt_transform = (
+            transform.from_bounds(*tile_bounds, width=dst_width, height=dst_height)
+            * Affine.translation(-num_pad_pixels, -num_pad_pixels)
+        )
+        vrt_height, vrt_width = dst_height + 2 * num_pad_pixels, dst_width + 2 * num_pad_pixels
+
+        # remove padding in output
+        out_window = windows.Window(
+            col_off=num_pad_pixels, row_off=num_pad_pixels, width=dst_width, height=dst_height
+        )
+
+        # construct VRT
+        with contextlib.ExitStack() as es:
+            with trace('build_vrt'):
+                vrt = es.enter_context(WarpedVRT(
                     src, crs=cls._TARGET_CRS, resampling=reproject_enum,
                     transform=vrt_transform, width=vrt_width, height=vrt_height,
                     add_alpha=not cls._has_alpha_band(src)
+                ))
+
+            # read data and alpha band in one pass, so the window is only warped once
+            mask_idx = vrt.count
+            with trace('warp_and_read'):
+                tile_data, alpha = vrt.read(
+                    [1, mask_idx], resampling=resampling_enum, window=out_window,
+                    out_shape=(2, *tile_size)
                 )
-            )
 
-            # read data
-            with warnings.catch_warnings(), trace('read_from_vrt'):
-                warnings.filterwarnings('ignore', message='invalid value encountered.*')
-                tile_data = vrt.read(
-                    1, resampling=resampling_enum, window=out_window, out_shape=tile_size
+        mask = cls._alpha_mask(alpha, resampling_enum)
+        return tile_data, mask
+
+    @classmethod
+    def _read_direct(cls, src: 'DatasetReader',
+                     tile_bounds: Tuple[float, float, float, float],
+                     tile_size: Tuple[int, int],
+                     resampling_enum: Any) -> Tuple[np.ndarray, np.ndarray]:
+        """Read a tile from a raster in target CRS without warping, returns data and invalid mask"""
+        from rasterio import windows
+        from rasterio.enums import ColorInterp
+
+        tile_data = np.zeros(tile_size, dtype=src.dtypes[0])
+        mask = np.ones(tile_size, dtype='bool')
+
+        out_height, out_width = tile_size
+        pixel_width = (tile_bounds[2] - tile_bounds[0]) / out_width
+        pixel_height = (tile_bounds[3] - tile_bounds[1]) / out_height
+
+        # part of the tile covered by the raster, in output pixels
+        src_bounds = src.bounds
+        col_start = max(0, round((src_bounds.left - tile_bounds[0]) / pixel_width))
+        col_stop = min(out_width, round((src_bounds.right - tile_bounds[0]) / pixel_width))
+        row_start = max(0, round((tile_bounds[3] - src_bounds.top) / pixel_height))
+        row_stop = min(out_height, round((tile_bounds[3] - src_bounds.bottom) / pixel_height))
+
+        if col_stop <= col_start or row_stop <= row_start:
+            return tile_data, mask
+
+        # source window of exactly these output pixels, clipped to the raster
+        window = windows.from_bounds(
+            tile_bounds[0] + col_start * pixel_width,
+            tile_bounds[3] - row_stop * pixel_height,
+            tile_bounds[0] + col_stop * pixel_width,
+            tile_bounds[3] - row_start * pixel_height,
+            transform=src.transform
+        ).intersection(windows.Window(0, 0, src.width, src.height))
+
+        out_shape = (row_stop - row_start, col_stop - col_start)
+        out_slice = (slice(row_start, row_stop), slice(col_start, col_stop))
+
+        if ColorInterp.alpha in src.colorinterp:
+            # read data and alpha band in one pass
+            alpha_idx = src.colorinterp.index(ColorInterp.alpha) + 1
+            with trace('read_data'):
+                data, alpha = src.read(
+                    [1, alpha_idx], window=window, out_shape=(2, *out_shape),
+                    resampling=resampling_enum
+                )
+            tile_data[out_slice] = data
+            mask[out_slice] = cls._alpha_mask(alpha, resampling_enum)
+        else:
+            with trace('read_data'):
+                tile_data[out_slice] = src.read(
+                    1, window=window, out_shape=out_shape, resampling=resampling_enum
                 )
 
-                # assemble alpha mask
-                mask_idx = vrt.count
-                mask = vrt.read(mask_idx, window=out_window, out_shape=tile_size) == 0
+            with trace('read_masks'):
+                mask[out_slice] = src.read_masks(1, window=window, out_shape=out_shape) == 0
 
-                if src.nodata is not None:
-                    mask |= tile_data == src.nodata
+        return tile_data, mask
 
-        return np.ma.masked_array(tile_data, mask=mask)
+    @classmethod
+    @trace('get_raster_metatile')
+    def _get_raster_metatile(cls, path: str, *,
+                             tile_bounds: Sequence[Tuple[float, float, float, float]],
+                             block_shape: Tuple[int, int],
+                             tile_size: Tuple[int, int] = (256, 256),
+                             **kwargs: Any) -> List[Optional[np.ma.MaskedArray]]:
+        """Read a block of adjacent tiles in one pass and slice it into single tiles.
+
+        Tile bounds are given row by row. Returns one array per tile, None for tiles
+        outside of the dataset.
+        """
+        num_rows, num_cols = block_shape
+        block_bounds = (
+            min(b[0] for b in tile_bounds), min(b[1] for b in tile_bounds),
+            max(b[2] for b in tile_bounds), max(b[3] for b in tile_bounds)
+        )
+        block_size = (num_rows * tile_size[0], num_cols * tile_size[1])
+
+        try:
+            block = cls._get_raster_tile(
+                path, tile_bounds=block_bounds, tile_size=block_size, **kwargs
+            )
+        except exceptions.TileOutOfBoundsError:
+            # block too sparse as a whole, single tiles may still be covered
+            tiles: List[Optional[np.ma.MaskedArray]] = []
+            for bounds in tile_bounds:
+                try:
+                    tiles.append(cls._get_raster_tile(
+                        path, tile_bounds=bounds, tile_size=tile_size, **kwargs
+                    ))
+                except exceptions.TileOutOfBoundsError:
+                    tiles.append(None)
+            return tiles
+
+        tile_height, tile_width = tile_size
+        return [
+            block[row * tile_height:(row + 1) * tile_height,
+                  col * tile_width:(col + 1) * tile_width].copy()
+            for row in range(num_rows) for col in range(num_cols)
+        ]
 
     def get_raster_tile(self, dataset, *,
                         tile_bounds: Sequence[float] = None,
                         tile_size: Sequence[int] = None,
                         preserve_values: bool = False,
-                        asynchronous: bool = False) -> Any:
+                        asynchronous: bool = False,
+                        tile_xyz: Tuple[int, int, int] = None,
+                        priority: Priority = Priority.INTERACTIVE) -> Any:
         # This wrapper handles cache interaction and asynchronous tile retrieval.
         # The real work is done in _get_raster_tile.
 
         future: Future[np.ma.MaskedArray]
         result: np.ma.MaskedArray
 
-        if not settings.USE_S3_RASTERS:
-            path = dataset.filepath.path
-        if settings.USE_S3_RASTERS:
-            path = dataset.filepath.url
+        path = raster_path(dataset)
 
         if tile_size is None:
             tile_size = settings.DEFAULT_TILE_SIZE
 
-        # make sure all arguments are hashable
-        kwargs = dict(
-            path=path,
-            tile_bounds=tuple(tile_bounds) if tile_bounds else None,
-            tile_size=tuple(tile_size),
-            preserve_values=preserve_values,
-            reprojection_method=settings.REPROJECTION_METHOD,
-            resampling_method=settings.RESAMPLING_METHOD
+        kwargs = tile_read_kwargs(
+            path, tile_bounds=tile_bounds, tile_size=tile_size, preserve_values=preserve_values
         )
 
         cache_key = cachetools.keys.hashkey(**kwargs)
 
+        if access_logger.isEnabledFor(logging.INFO):
+            access_logger.info(key_digest(cache_key).hex())
+
         try:
-            with self._cache_lock:
-                result = self._raster_cache[cache_key]
+            result = self._get_from_cache(cache_key)
         except KeyError:
             pass
         else:
@@ -472,26 +1088,269 @@ class RasterDriver():
             else:
                 return result
 
-        retrieve_tile = functools.partial(self._get_raster_tile, **kwargs)
+        block = None
+        if tile_xyz is not None and settings.RASTER_METATILE_SIZE > 1:
+            block = metatile_read(tile_xyz, kwargs)
+
+        # shed new reads under load, joining a read in flight costs nothing
+        with _inflight_lock:
+            joins_read = (cache_key if block is None else block.key) in _inflight
+        if not joins_read and not admission.admit():
+            raise exceptions.TileReadShedError('too many tile reads queued')
+
+        # not part of the cache key, geometry follows from the path
+        geometry = get_raster_geometry(dataset, path)
+        deadline = deadline_for(priority)
+
+        if block is not None:
+            future = self._get_from_metatile(block, geometry, priority, deadline)
+            self._prefetch(tile_xyz, kwargs, geometry)
+            return future if asynchronous else future.result()
+
+        retrieve_tile = functools.partial(self._get_raster_tile, geometry=geometry, **kwargs)
+        future, is_owner = submit_read(
+            cache_key, retrieve_tile, batch=(kwargs, geometry), priority=priority,
+            deadline=deadline
+        )
+
+        if is_owner and tile_xyz is not None:
+            self._prefetch(tile_xyz, kwargs, geometry)
 
-        future = executor.submit(retrieve_tile)
+        if not is_owner:
+            return future if asynchronous else future.result()
 
         def cache_callback(future: Future) -> None:
-            # insert result into global cache if execution was successful
-            if future.exception() is None:
-                self._add_to_cache(cache_key, future.result())
+            # insert result into global cache if execution was successful, then
+            # release the in-flight slot (in this order, so no read slips through)
+            def fill() -> None:
+                if not future.cancelled() and future.exception() is None:
+                    self._add_to_cache(cache_key, future.result())
+
+            fill_cache_later(fill, functools.partial(release_read, cache_key, future))
 
         if asynchronous:
             future.add_done_callback(cache_callback)
             return future
         else:
-            result = future.result()
-            cache_callback(future)
-            return result
+            try:
+                return future.result()
+            finally:
+                cache_callback(future)
+
+    def get_degraded_tile(self, dataset, tile_xyz: Tuple[int, int, int], *,
+                          tile_size: Sequence[int] = None,
+                          preserve_values: bool = False,
+                          max_levels: int = None) -> Optional[np.ma.MaskedArray]:
+        """Cut the given tile from the closest cached ancestor tile and scale it up.
+
+        Looks at most max_levels zoom levels up and never reads the raster. Returns None if
+        no ancestor is cached.
+        """
+        import mercantile
+
+        if tile_size is None:
+            tile_size = (settings.DEFAULT_TILE_SIZE, settings.DEFAULT_TILE_SIZE)
+
+        if max_levels is None:
+            max_levels = settings.SHED_DEGRADE_LEVELS
+
+        path = raster_path(dataset)
+        tile_x, tile_y, tile_z = tile_xyz
+
+        for level in range(1, min(max_levels, tile_z) + 1):
+            factor = 2 ** level
+            if tile_size[0] % factor or tile_size[1] % factor:
+                break
 
-    def _add_to_cache(self, key: Any, value: Any) -> None:
+            parent = (tile_x >> level, tile_y >> level, tile_z - level)
+            kwargs = tile_read_kwargs(
+                path, tile_bounds=mercantile.xy_bounds(*parent), tile_size=tile_size,
+                preserve_values=preserve_values
+            )
+            try:
+                parent_data = self._get_from_cache(cachetools.keys.hashkey(**kwargs))
+            except KeyError:
+                continue
+
+            height, width = tile_size[0] // factor, tile_size[1] // factor
+            row = (tile_y - (parent[1] << level)) * height
+            col = (tile_x - (parent[0] << level)) * width
+            part = parent_data[row:row + height, col:col + width]
+
+            # nearest neighbour upsampling keeps values intact for categorical data
+            data = np.ma.getdata(part).repeat(factor, axis=0).repeat(factor, axis=1)
+            mask = np.ma.getmaskarray(part).repeat(factor, axis=0).repeat(factor, axis=1)
+            return np.ma.masked_array(data, mask=mask)
+
+        return None
+
+    def _prefetch(self, tile_xyz: Tuple[int, int, int], kwargs: Dict[str, Any],
+                  geometry: Optional[RasterGeometry]) -> None:
+        """Speculatively read neighbours and children of a missed tile into the cache.
+
+        Prefetches are dropped while the executor is busy with other reads.
+        """
+        import mercantile
+
+        radius = settings.RASTER_PREFETCH_RADIUS
+        if radius <= 0:
+            return
+
+        tile_x, tile_y, tile_z = tile_xyz
+        num_tiles = 2 ** tile_z
+        candidates = [
+            (x, y, tile_z)
+            for y in range(max(0, tile_y - radius), min(num_tiles, tile_y + radius + 1))
+            for x in range(max(0, tile_x - radius), min(num_tiles, tile_x + radius + 1))
+            if (x, y) != (tile_x, tile_y)
+        ]
+        if settings.RASTER_PREFETCH_CHILDREN and tile_z < 22:
+            candidates.extend(
+                (child.x, child.y, child.z) for child in mercantile.children(*tile_xyz)
+            )
+
+        if settings.RASTER_METATILE_SIZE > 1:
+            # neighbours in the block of the missed tile are being read along with it
+            block = set(metatile_block(tile_xyz, settings.RASTER_METATILE_SIZE))
+            candidates = [candidate for candidate in candidates if candidate not in block]
+
+        for candidate in candidates:
+            tile_bounds = tuple(mercantile.xy_bounds(*candidate))
+
+            if geometry is not None and not (
+                tile_bounds[0] < geometry.bounds[2] and geometry.bounds[0] < tile_bounds[2]
+                and tile_bounds[1] < geometry.bounds[3] and geometry.bounds[1] < tile_bounds[3]
+            ):
+                continue
+
+            tile_kwargs = dict(kwargs, tile_bounds=tile_bounds)
+            key = cachetools.keys.hashkey(**tile_kwargs)
+            if key in self._raster_cache:
+                continue
+
+            with _inflight_lock:
+                if key in _inflight:
+                    continue
+                if len(_inflight) >= settings.RASTER_PREFETCH_MAX_PENDING:
+                    # foreground reads are waiting, don't take worker slots from them
+                    _read_counters['prefetch_dropped'] += 1
+                    continue
+
+            retrieve_tile = functools.partial(
+                self._get_raster_tile, geometry=geometry, **tile_kwargs
+            )
+            future, is_owner = submit_read(
+                key, retrieve_tile, batch=(tile_kwargs, geometry), priority=Priority.PREFETCH,
+                deadline=deadline_for(Priority.PREFETCH)
+            )
+            if not is_owner:
+                continue
+
+            with _inflight_lock:
+                _read_counters['prefetched'] += 1
+
+            def cache_callback(future: Future, key: Any = key) -> None:
+                def fill() -> None:
+                    if not future.cancelled() and future.exception() is None:
+                        self._add_to_cache(key, future.result())
+
+                fill_cache_later(fill, functools.partial(release_read, key, future))
+
+            future.add_done_callback(cache_callback)
+
+    def _get_from_metatile(self, block: MetatileRead, geometry: Optional[RasterGeometry],
+                           priority: Priority, deadline: Optional[float]) -> Future:
+        block_key, tile_keys, tile_index = block.key, block.tile_keys, block.tile_index
+
+        retrieve_block = functools.partial(
+            self._get_raster_metatile, geometry=geometry, block_shape=block.shape,
+            **block.kwargs
+        )
+        block_future, is_owner = submit_read(
+            block_key, retrieve_block, priority=priority, deadline=deadline
+        )
+
+        if is_owner:
+            def cache_callback(block_future: Future) -> None:
+                def fill() -> None:
+                    if not block_future.cancelled() and block_future.exception() is None:
+                        for key, tile in zip(tile_keys, block_future.result()):
+                            if tile is not None:
+                                self._add_to_cache(key, tile)
+
+                fill_cache_later(
+                    fill, functools.partial(release_read, block_key, block_future)
+                )
+
+            block_future.add_done_callback(cache_callback)
+
+        # pick requested tile from the block
+        future: Future = Future()
+
+        def select_tile(block_future: Future) -> None:
+            if not future.set_running_or_notify_cancel():
+                return
+
+            # every failure must reach the requester, including a cancelled block read
+            try:
+                tile = block_future.result()[tile_index]
+                if tile is None:
+                    raise exceptions.TileOutOfBoundsError('dataset covers less than 1% of tile')
+            except Exception as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(tile)
+
+        block_future.add_done_callback(select_tile)
+        return future
+
+    def _get_from_cache(self, key: Any) -> np.ma.MaskedArray:
+        try:
+            return self._raster_cache[key]
+        except KeyError:
+            pass
+
+        # fall back to tiles decoded by other processes on this host
+        shared_cache = get_shared_cache()
+        if shared_cache is not None:
+            try:
+                result = shared_cache[key]
+            except KeyError:
+                pass
+            else:
+                self._add_to_cache(key, result, shared=False, disk=False)
+                return result
+
+        # fall back to tiles persisted by earlier runs
+        disk_cache = get_disk_cache()
+        if disk_cache is None:
+            raise KeyError(key)
+
+        result = decompress_tuple(unpack_tuple(disk_cache[('raster', key)]))
+        self._add_to_cache(key, result, disk=False)
+        return result
+
+    def _add_to_cache(self, key: Any, value: Any,
+                      shared: bool = True, disk: bool = True) -> None:
         try:
-            with self._cache_lock:
-                self._raster_cache[key] = value
+            self._raster_cache[key] = value
         except ValueError:  # value too large
-            pass
\ No newline at end of file
+            pass
+
+        shared_cache = get_shared_cache()
+        if shared and shared_cache is not None:
+            try:
+                shared_cache[key] = value
+            except ValueError:  # value too large
+                pass
+
+        disk_cache = get_disk_cache()
+        if disk and disk_cache is not None:
+            packed_value = pack_tuple(compress_ma(
+                value, settings.RASTER_CACHE_COMPRESS_LEVEL,
+                codec=settings.RASTER_CACHE_CODEC, shuffle=settings.RASTER_CACHE_SHUFFLE
+            ))
+            try:
+                disk_cache[('raster', key)] = packed_value
+            except ValueError:  # value too large
+                pass
\ No newline at end of file
@@ -0,0 +1,221 @@
+"""scheduler.py
+
+Priority scheduling of tile reads in front of the executor.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from concurrent.futures import CancelledError, Executor, Future
+
+import enum
+import time
+import heapq
+import functools
+import itertools
+import threading
+
+from django.conf import settings
+
+from server.utils import exceptions
+from server.utils.executor import executor_info, get_executor
+
+
+class Priority(enum.IntEnum):
+    """Priority classes of tile reads, lower values run first"""
+    INTERACTIVE = 0  # tiles of maps users are looking at
+    OVERVIEW = 1  # low zoom tiles
+    THUMBNAIL = 2  # dataset previews
+    PREFETCH = 3  # speculative reads nobody waits for yet
+
+
+def deadline_for(priority: Priority) -> Optional[float]:
+    """Return the monotonic time after which a read of the given priority is dropped"""
+    timeout = settings.TILE_DEADLINES.get(priority.name.lower())
+    if timeout is None:
+        return None
+    return time.monotonic() + timeout
+
+
+class _Job:
+    __slots__ = ('start', 'future', 'priority', 'deadline', 'submitted')
+
+    def __init__(self, start: Callable[[], Future], future: Future, priority: Priority,
+                 deadline: Optional[float]):
+        self.start = start
+        self.future = future
+        self.priority = priority
+        self.deadline = deadline
+        self.submitted = time.monotonic()
+
+
+class PriorityScheduler:
+    """Hands jobs to the executor by priority, dropping jobs that missed their deadline.
+
+    At most ``slots`` jobs are given to the executor at a time (one per worker), all others
+    wait here so that urgent jobs can overtake them. Jobs still queued at their deadline fail
+    with TileDeadlineExceeded instead of running, and futures cancelled while queued are
+    dropped. Running jobs always complete.
+
+    Jobs are started by calling ``start()``, which submits the actual work and returns
+    its future.
+    """
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self._queue: List[Tuple[int, int, _Job]] = []
+        self._jobs: Dict[Future, _Job] = {}
+        self._running = 0
+        self._seq = itertools.count()
+        self._counters = {'scheduled': 0, 'promoted': 0, 'expired': 0, 'cancelled': 0}
+        self._lock = threading.Lock()
+
+    def submit(self, start: Callable[[], Future], *, priority: Priority,
+               deadline: Optional[float] = None, future: Future = None) -> Future:
+        """Queue a job, returns a future of its result (the given one, if any).
+
+        Jobs of others may be started or dropped in the calling thread, so callers must
+        not hold locks that callbacks of their futures take.
+        """
+        if future is None:
+            future = Future()
+
+        job = _Job(start, future, priority, deadline)
+
+        with self._lock:
+            self._jobs[future] = job
+            heapq.heappush(self._queue, (priority, next(self._seq), job))
+            self._counters['scheduled'] += 1
+
+        self._dispatch()
+        return future
+
+    def promote(self, future: Future, priority: Priority, deadline: Optional[float]) -> None:
+        """Raise priority and extend deadline of a queued job, e.g. when a client joins a
+        prefetch. Does nothing if the job already runs."""
+        with self._lock:
+            job = self._jobs.get(future)
+            if job is None:
+                return
+
+            if job.deadline is not None:
+                job.deadline = None if deadline is None else max(job.deadline, deadline)
+
+            if priority < job.priority:
+                # the old heap entry goes stale and is skipped
+                job.priority = priority
+                heapq.heappush(self._queue, (priority, next(self._seq), job))
+                self._counters['promoted'] += 1
+
+    def _pop(self) -> Optional[_Job]:
+        while self._queue:
+            priority, _, job = heapq.heappop(self._queue)
+            if priority == job.priority:
+                return job
+        return None
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._lock:
+                if self._running >= self.slots:
+                    return
+
+                job = self._pop()
+                if job is None:
+                    return
+
+                del self._jobs[job.future]
+
+                if job.future.cancelled():
+                    self._counters['cancelled'] += 1
+                    continue
+
+                if job.deadline is not None and time.monotonic() > job.deadline:
+                    self._counters['expired'] += 1
+                    expired = True
+                else:
+                    self._running += 1
+                    expired = False
+
+            if not job.future.set_running_or_notify_cancel():
+                # cancelled in the meantime
+                if not expired:
+                    self._release_slot()
+                continue
+
+            if expired:
+                job.future.set_exception(exceptions.TileDeadlineExceeded(
+                    'tile read dropped after waiting past its deadline'
+                ))
+                continue
+
+            try:
+                inner = job.start()
+            except Exception as exc:
+                job.future.set_exception(exc)
+                self._release_slot()
+                continue
+
+            inner.add_done_callback(functools.partial(self._job_done, outer=job.future))
+
+    def _release_slot(self) -> None:
+        with self._lock:
+            self._running -= 1
+
+    def _job_done(self, inner: Future, outer: Future) -> None:
+        self._release_slot()
+
+        if inner.cancelled():
+            outer.set_exception(CancelledError())
+        elif inner.exception() is not None:
+            outer.set_exception(inner.exception())
+        else:
+            outer.set_result(inner.result())
+
+        self._dispatch()
+
+    def load(self) -> Tuple[int, float]:
+        """Return number of queued jobs and seconds the oldest of them has been waiting"""
+        with self._lock:
+            # jobs are kept in submission order
+            oldest = next(iter(self._jobs.values()), None)
+            if oldest is None:
+                return 0, 0.
+            return len(self._jobs), time.monotonic() - oldest.submitted
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(
+                self._counters, slots=self.slots, running=self._running,
+                queued=len(self._jobs)
+            )
+
+
+_scheduler: Optional[PriorityScheduler] = None
+_scheduler_executor: Optional[Executor] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> PriorityScheduler:
+    """Return the scheduler of tile reads, with one slot per worker of the executor."""
+    global _scheduler, _scheduler_executor
+
+    executor = get_executor()
+    with _scheduler_lock:
+        # executor may have been replaced, e.g. by benchmark_engine
+        if _scheduler is None or _scheduler_executor is not executor:
+            _scheduler = PriorityScheduler(executor_info(executor)['workers'])
+            _scheduler_executor = executor
+        return _scheduler
+
+
+def current_scheduler() -> Optional[PriorityScheduler]:
+    """Return the scheduler of tile reads, None if no read has been scheduled yet."""
+    with _scheduler_lock:
+        return _scheduler
+
+
+def scheduler_load() -> Tuple[int, float]:
+    """Return load of the scheduler of tile reads, see PriorityScheduler.load"""
+    scheduler = current_scheduler()
+    if scheduler is None:
+        return 0, 0.
+    return scheduler.load()
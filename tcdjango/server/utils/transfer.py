@@ -0,0 +1,132 @@
+"""transfer.py
+
+Hand tile arrays from worker processes to the parent through shared memory.
+"""
+
+from typing import Any, Callable, NamedTuple, Optional, Tuple
+from concurrent.futures import Future
+
+import numpy as np
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+    has_shared_memory = True
+except ImportError:  # pragma: no cover
+    has_shared_memory = False
+
+
+class SharedArray(NamedTuple):
+    """Descriptor of a masked array stored in a shared memory block (data, then mask)"""
+    name: str
+    dtype: str
+    shape: Tuple[int, ...]
+    fill_value: Any
+
+
+def export_array(arr: np.ma.MaskedArray, threshold: int) -> Any:
+    """Move a large masked array into shared memory and return its descriptor.
+
+    Arrays smaller than threshold bytes are returned as they are (and pickled as usual).
+    """
+    data = np.ascontiguousarray(np.ma.getdata(arr))
+    mask = np.ascontiguousarray(np.ma.getmaskarray(arr))
+
+    if data.nbytes < threshold:
+        return arr
+
+    shm = shared_memory.SharedMemory(create=True, size=data.nbytes + mask.nbytes)
+    try:
+        np.ndarray(data.shape, data.dtype, buffer=shm.buf)[...] = data
+        np.ndarray(mask.shape, mask.dtype, buffer=shm.buf, offset=data.nbytes)[...] = mask
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+
+    # the receiving process owns (and unlinks) the block from here on, don't let this
+    # process' resource tracker destroy it when the worker exits
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    shm.close()
+
+    return SharedArray(shm.name, data.dtype.str, data.shape, arr.fill_value)
+
+
+def import_array(obj: Any) -> Any:
+    """Turn a descriptor back into a masked array and release its shared memory block"""
+    if not isinstance(obj, SharedArray):
+        return obj
+
+    shm = shared_memory.SharedMemory(name=obj.name)
+    try:
+        data = np.ndarray(obj.shape, obj.dtype, buffer=shm.buf).copy()
+        mask = np.ndarray(obj.shape, 'bool', buffer=shm.buf, offset=data.nbytes).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return np.ma.masked_array(data, mask=mask, fill_value=obj.fill_value)
+
+
+def run_exporting(retrieve: Callable[[], Any], threshold: int) -> Any:
+    """Run a tile read in a worker, returning large arrays as shared memory descriptors.
+
+    Handles single arrays and lists as returned by metatile and batched reads, whose
+    entries may also be None or exceptions.
+    """
+    result = retrieve()
+    if isinstance(result, list):
+        return [
+            export_array(r, threshold) if isinstance(r, np.ma.MaskedArray) else r
+            for r in result
+        ]
+    return export_array(result, threshold)
+
+
+def import_result(result: Any) -> Any:
+    """Counterpart of run_exporting in the receiving process"""
+    if isinstance(result, list):
+        return [import_array(r) for r in result]
+    return import_array(result)
+
+
+def release_result(result: Any) -> None:
+    """Unlink shared memory of a result that is not going to be imported"""
+    items = result if isinstance(result, list) else [result]
+    for item in items:
+        if isinstance(item, SharedArray):
+            try:
+                shm = shared_memory.SharedMemory(name=item.name)
+            except FileNotFoundError:
+                continue
+            shm.close()
+            shm.unlink()
+
+
+def chain_import(inner: Future, outer: Future) -> None:
+    """Resolve future outer with the imported result of the finished future inner"""
+    if inner.cancelled():
+        outer.cancel()
+        return
+
+    if not outer.set_running_or_notify_cancel():
+        # nobody waits for the result anymore
+        if inner.exception() is None:
+            release_result(inner.result())
+        return
+
+    exc = inner.exception()
+    if exc is not None:
+        outer.set_exception(exc)
+        return
+
+    try:
+        outer.set_result(import_result(inner.result()))
+    except Exception as exc:
+        outer.set_exception(exc)
+
+
+def shared_memory_threshold(uses_processes: bool, threshold: Optional[int]) -> Optional[int]:
+    """Return the size above which results are moved through shared memory, None if never"""
+    if threshold is None or not has_shared_memory or not uses_processes:
+        return None
+    return threshold
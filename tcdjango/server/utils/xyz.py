@@ -6,28 +6,33 @@ Utilities to work with XYZ Mercator tiles.
 from typing import Sequence, Tuple, Any
 
 import mercantile
+from django.conf import settings
 
 from server.utils import exceptions
+from server.utils.coverage import get_coverage_index
 from server.utils.raster_base import RasterDriver
-from server.models import DatasetStats
+from server.utils.scheduler import Priority
 
 # TODO: add accurate signature if mypy ever supports conditional return types
 def get_tile_data(driver: RasterDriver, dataset, tile_xyz: Tuple[int, int, int] = None,
                   *, tile_size: Tuple[int, int] = (256, 256),
                   preserve_values: bool = False,
-                  asynchronous: bool = False) -> Any:
-    """Retrieve raster image from driver for given XYZ tile and keys"""
+                  asynchronous: bool = False,
+                  priority: Priority = None) -> Any:
+    """Retrieve raster image from driver for given XYZ tile and keys
+
+    Reads are scheduled by the given priority, or by tile_priority of the tile.
+    """
 
     if tile_xyz is None:
         # read whole dataset
         return driver.get_raster_tile(
             tile_size=tile_size, preserve_values=preserve_values,
-            asynchronous=asynchronous
+            asynchronous=asynchronous, priority=priority or Priority.THUMBNAIL
         )
 
     # determine bounds for given tile
-    metadata = DatasetStats.objects.get(dataset=dataset)
-    wgs_bounds = metadata.get_bounds()
+    wgs_bounds = dataset.stats.get_bounds()
 
     tile_x, tile_y, tile_z = tile_xyz
 
@@ -36,15 +41,30 @@ def get_tile_data(driver: RasterDriver, dataset, tile_xyz: Tuple[int, int, int]
             f'Tile {tile_z}/{tile_x}/{tile_y} is outside image bounds'
         )
 
+    coverage_index = get_coverage_index(dataset.stats)
+    if coverage_index is not None and not coverage_index.intersects(tile_x, tile_y, tile_z):
+        raise exceptions.TileOutOfBoundsError(
+            f'Tile {tile_z}/{tile_x}/{tile_y} does not intersect valid data'
+        )
+
     mercator_tile = mercantile.Tile(x=tile_x, y=tile_y, z=tile_z)
     target_bounds = mercantile.xy_bounds(mercator_tile)
 
     return driver.get_raster_tile(
         dataset=dataset, tile_bounds=target_bounds, tile_size=tile_size,
-        preserve_values=preserve_values, asynchronous=asynchronous
+        preserve_values=preserve_values, asynchronous=asynchronous,
+        tile_xyz=(tile_x, tile_y, tile_z),
+        priority=tile_priority(tile_z) if priority is None else priority
     )
 
 
+def tile_priority(tile_z: int) -> Priority:
+    """Return the scheduling priority of a map tile at the given zoom level."""
+    if tile_z <= settings.OVERVIEW_MAX_ZOOM:
+        return Priority.OVERVIEW
+    return Priority.INTERACTIVE
+
+
 def tile_exists(bounds: Sequence[float], tile_x: int, tile_y: int, tile_z: int) -> bool:
     """Check if an XYZ tile is inside the given physical bounds."""
     mintile = mercantile.tile(bounds[0], bounds[3], tile_z)
@@ -0,0 +1,126 @@
+from rest_framework import viewsets
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+
+from server.models import Dataset
+from server.serializers import BatchSerializer
+from server.renderers import BatchRenderer
+from server.utils import xyz, image, exceptions
+from server.utils.raster_base import RasterDriver
+
+from drf_yasg.utils import swagger_auto_schema
+
+from django.conf import settings
+
+from typing import Any, List, Tuple
+
+import struct
+
+import numpy as np
+
+#: Header preceding every tile of a batch response:
+#: dataset id, z, x, y, status and length of the following PNG in bytes
+RECORD_HEADER = struct.Struct('<IIIIBI')
+
+TILE_OK = 0
+TILE_EMPTY = 1  # tile is outside of the dataset or fully masked, no PNG follows
+TILE_UNAVAILABLE = 2  # server too busy to read the tile, retry later, no PNG follows
+
+
+class Batch(viewsets.ViewSet):
+    """
+    Return many singleband tiles in one response
+    """
+    renderer_classes = [BatchRenderer]
+
+    @swagger_auto_schema(
+        request_body=BatchSerializer,
+        operation_id="batch (tiles)"
+    )
+    def create(self, request) -> bytes:
+        """
+        Render every requested tile of every requested dataset.
+
+        The response is a sequence of records in request order (datasets, then tiles).
+        Each record is a little-endian header of dataset id, z, x, y (uint32), status
+        (uint8, 0 = PNG follows, 1 = tile without valid data, 2 = server busy, retry)
+        and PNG length (uint32), followed by the PNG itself.
+        """
+        params = BatchSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        # one query for all datasets and their stats
+        datasets = Dataset.objects.select_related('stats').in_bulk(data['datasets'])
+        missing = set(data['datasets']) - set(datasets)
+        if missing:
+            raise NotFound(f"Unknown datasets: {', '.join(map(str, sorted(missing)))}")
+
+        colormap = data.get('colormap', 'gray')
+        stretch_min = data.get('stretch_min', None)
+        stretch_max = data.get('stretch_max', None)
+        tile_size = data.get('tile_size', None)
+
+        if tile_size is None:
+            tile_size = settings.DEFAULT_TILE_SIZE
+
+        tile_size = (tile_size, tile_size)
+
+        driver = RasterDriver()
+
+        # submit all reads first so they run in parallel
+        pending: List[Tuple[Any, ...]] = []
+        for dataset_id in data['datasets']:
+            dataset = datasets[dataset_id]
+
+            stretch_range = dataset.stats.get_range()
+            if stretch_min is not None and stretch_max is not None:
+                stretch_range = [stretch_min, stretch_max]
+
+            for z, x, y in data['tiles']:
+                tile_xyz = (x, y, z)
+                png_key = image.png_cache_key(
+                    [dataset], tile_xyz, colormap=colormap, stretch_ranges=[stretch_range],
+                    tile_size=tile_size
+                )
+
+                png = image.get_cached_png(png_key)
+                future = None
+                status = TILE_EMPTY
+                if png is None:
+                    try:
+                        future = xyz.get_tile_data(
+                            driver, dataset, tile_xyz, tile_size=tile_size, asynchronous=True
+                        )
+                    except exceptions.TileOutOfBoundsError:
+                        pass
+                    except exceptions.TileReadShedError:
+                        status = TILE_UNAVAILABLE
+
+                pending.append(
+                    (dataset_id, tile_xyz, stretch_range, png_key, png, future, status)
+                )
+
+        out = bytearray()
+        for dataset_id, (x, y, z), stretch_range, png_key, png, future, status in pending:
+            if png is None and future is not None:
+                try:
+                    tile_data = future.result()
+                except exceptions.TileOutOfBoundsError:
+                    pass
+                except exceptions.TileDeadlineExceeded:
+                    status = TILE_UNAVAILABLE
+                else:
+                    if not np.ma.getmaskarray(tile_data).all():
+                        tile = image.to_uint8(tile_data, *stretch_range)
+                        png = image.cache_png(
+                            png_key, image.array_to_png(tile, colormap=colormap)
+                        )
+
+            if png is None:
+                out += RECORD_HEADER.pack(dataset_id, z, x, y, status, 0)
+            else:
+                out += RECORD_HEADER.pack(dataset_id, z, x, y, TILE_OK, len(png))
+                out += png
+
+        return Response(bytes(out))
@@ -0,0 +1,17 @@
+from django.conf import settings
+from rest_framework.response import Response
+
+from server.utils import image
+
+from typing import Tuple
+
+
+def empty_tile_response(tile_size: Tuple[int, int]) -> Response:
+    """Return the shared transparent PNG for tiles without any valid data.
+
+    Such tiles never change, so clients and proxies may cache them for long.
+    """
+    return Response(
+        image.empty_png(tile_size),
+        headers={'Cache-Control': f'public, max-age={settings.EMPTY_TILE_MAX_AGE}'}
+    )
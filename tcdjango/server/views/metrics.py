@@ -0,0 +1,35 @@
+from rest_framework import viewsets
+from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
+
+from server.utils.admission import admission_info
+from server.utils.executor import executor_info
+from server.utils.handles import get_dataset_pool
+from server.utils.image import png_cache_info
+from server.utils.raster_base import cache_info, read_info
+
+from drf_yasg.utils import swagger_auto_schema
+
+from typing import Any, Dict
+
+
+class Metrics(viewsets.ViewSet):
+    """
+    Return load and cache statistics of this server process
+    """
+    renderer_classes = [JSONRenderer]
+
+    @swagger_auto_schema(operation_id="metrics")
+    def retrieve(self, request) -> Dict[str, Any]:
+        """
+        Report tile read queue depth and latency, shed and degraded tiles, scheduler,
+        executor, cache and file handle statistics. Values are per server process.
+        """
+        return Response({
+            'admission': admission_info(),
+            'reads': read_info(),
+            'executor': executor_info(),
+            'raster_cache': cache_info(),
+            'png_cache': png_cache_info(),
+            'handles': get_dataset_pool().info()
+        }, headers={'Cache-Control': 'no-store'})
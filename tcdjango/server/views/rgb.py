@@ -6,8 +6,11 @@ from server.models import Dataset, DatasetStats
 from server.serializers import RGBSerializer
 from server.renderers import PNGRenderer
 from server.utils.cmaps import AVAILABLE_CMAPS
-from server.utils import xyz, image
+from server.utils import xyz, image, exceptions, admission
 from server.utils.raster_base import RasterDriver
+from server.utils.scheduler import Priority
+from server.views.empty import empty_tile_response
+from server.views.unavailable import degraded_response, unavailable_response
 
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
@@ -134,12 +137,22 @@ class RGB(viewsets.ViewSet):
         if tile_size is None:
             tile_size = settings.DEFAULT_TILE_SIZE
 
+        tile_size = (tile_size, tile_size)
+
         stretch_range = metadata.get_range()
         if stretch_min is not None and stretch_max is not None:
             stretch_range = [stretch_min, stretch_max]
         
         stretch_ranges_ = [stretch_range, stretch_range, stretch_range]
 
+        png_key = image.png_cache_key(
+            [r_dataset, g_dataset, b_dataset], tile_xyz, colormap=None,
+            stretch_ranges=stretch_ranges_, tile_size=tile_size
+        )
+        png = image.get_cached_png(png_key)
+        if png is not None:
+            return Response(png)
+
         driver = RasterDriver()
 
         def get_band_future(band_id: int) -> Future:
@@ -147,18 +160,47 @@ class RGB(viewsets.ViewSet):
             return xyz.get_tile_data(driver, dataset, tile_xyz,
                                      tile_size=tile_size, asynchronous=True)
 
-        futures = [get_band_future(band_id) for band_id in rgb_values]
-        band_items = zip(rgb_values, stretch_ranges_, futures)
-
-        out_arrays = []
-
-        for i, (band_key, band_stretch_override, band_data_future) in enumerate(band_items):
-            band_data = band_data_future.result()
-            out_arrays.append(image.to_uint8(band_data, *band_stretch_override))
+        try:
+            futures = [get_band_future(band_id) for band_id in rgb_values]
+            band_items = zip(rgb_values, stretch_ranges_, futures)
+
+            band_data = [
+                (band_stretch_override, band_data_future.result())
+                for band_key, band_stretch_override, band_data_future in band_items
+            ]
+        except exceptions.TileOutOfBoundsError:
+            return empty_tile_response(tile_size)
+        except exceptions.TileDeadlineExceeded:
+            return unavailable_response()
+        except exceptions.TileReadShedError:
+            # server is busy, fall back to cached tiles of lower zoom for all bands
+            band_data = []
+            for band_id, band_stretch_override in zip(rgb_values, stretch_ranges_):
+                dataset = get_object_or_404(queryset, pk=band_id)
+                data = driver.get_degraded_tile(dataset, tile_xyz, tile_size=tile_size)
+                if data is None:
+                    return unavailable_response()
+                band_data.append((band_stretch_override, data))
+            admission.count_degraded()
+            degraded = True
+        else:
+            degraded = False
+
+        # degraded tiles are never cached, even if empty
+        if not degraded and all(np.ma.getmaskarray(data).all() for _, data in band_data):
+            return empty_tile_response(tile_size)
+
+        out_arrays = [
+            image.to_uint8(data, *band_stretch_override)
+            for band_stretch_override, data in band_data
+        ]
         
         out = np.ma.stack(out_arrays, axis=-1)
-        print(out)
-        return Response(image.array_to_png(out))
+
+        if degraded:
+            return degraded_response(image.array_to_png(out))
+
+        return Response(image.cache_png(png_key, image.array_to_png(out)))
 
     
     @swagger_auto_schema(
@@ -190,28 +232,50 @@ class RGB(viewsets.ViewSet):
         if tile_size is None:
             tile_size = settings.DEFAULT_TILE_SIZE
 
+        tile_size = (tile_size, tile_size)
+
         stretch_range = metadata.get_range()
         if stretch_min is not None and stretch_max is not None:
             stretch_range = [stretch_min, stretch_max]
         
         stretch_ranges_ = [stretch_range, stretch_range, stretch_range]
 
+        png_key = image.png_cache_key(
+            [r_dataset, g_dataset, b_dataset], tile_xyz, colormap=None,
+            stretch_ranges=stretch_ranges_, tile_size=tile_size
+        )
+        png = image.get_cached_png(png_key)
+        if png is not None:
+            return Response(png)
+
         driver = RasterDriver()
 
         def get_band_future(band_id: int) -> Future:
             dataset = get_object_or_404(queryset, pk=band_id)
             return xyz.get_tile_data(driver, dataset, tile_xyz,
-                                     tile_size=tile_size, asynchronous=True)
-
-        futures = [get_band_future(band_id) for band_id in rgb_values]
-        band_items = zip(rgb_values, stretch_ranges_, futures)
-
-        out_arrays = []
-
-        for i, (band_key, band_stretch_override, band_data_future) in enumerate(band_items):
-            band_data = band_data_future.result()
-            out_arrays.append(image.to_uint8(band_data, *band_stretch_override))
+                                     tile_size=tile_size, asynchronous=True,
+                                     priority=Priority.THUMBNAIL)
+
+        try:
+            futures = [get_band_future(band_id) for band_id in rgb_values]
+            band_items = zip(rgb_values, stretch_ranges_, futures)
+
+            band_data = [
+                (band_stretch_override, band_data_future.result())
+                for band_key, band_stretch_override, band_data_future in band_items
+            ]
+        except exceptions.TileOutOfBoundsError:
+            return empty_tile_response(tile_size)
+        except (exceptions.TileDeadlineExceeded, exceptions.TileReadShedError):
+            return unavailable_response()
+
+        if all(np.ma.getmaskarray(data).all() for _, data in band_data):
+            return empty_tile_response(tile_size)
+
+        out_arrays = [
+            image.to_uint8(data, *band_stretch_override)
+            for band_stretch_override, data in band_data
+        ]
         
         out = np.ma.stack(out_arrays, axis=-1)
-        print(out)
-        return Response(image.array_to_png(out))
\ No newline at end of file
+        return Response(image.cache_png(png_key, image.array_to_png(out)))
\ No newline at end of file
@@ -6,8 +6,11 @@ from server.models import Dataset, DatasetStats
 from server.serializers import SinglebandSerializer
 from server.renderers import PNGRenderer
 from server.utils.cmaps import AVAILABLE_CMAPS
-from server.utils import xyz, image
+from server.utils import xyz, image, exceptions, admission
 from server.utils.raster_base import RasterDriver
+from server.utils.scheduler import Priority
+from server.views.empty import empty_tile_response
+from server.views.unavailable import degraded_response, unavailable_response
 
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
@@ -19,6 +22,8 @@ from typing.io import BinaryIO
 
 import collections
 
+import numpy as np
+
 Number = TypeVar('Number', int, float)
 RGBA = Tuple[Number, Number, Number, Number]
 
@@ -134,14 +139,45 @@ class Singleband(viewsets.ViewSet):
         if colormap is None:
             colormap = 'gray'
 
+        png_key = image.png_cache_key(
+            [dataset], tile_xyz, colormap=colormap, stretch_ranges=[stretch_range],
+            tile_size=tile_size
+        )
+        png = image.get_cached_png(png_key)
+        if png is not None:
+            return Response(png)
+
         preserve_values = isinstance(colormap, collections.Mapping)
         driver = RasterDriver()
-        tile_data = xyz.get_tile_data(
-           driver, dataset, tile_xyz, tile_size=tile_size, preserve_values=preserve_values
-        )
+        degraded = False
+        try:
+            tile_data = xyz.get_tile_data(
+               driver, dataset, tile_xyz, tile_size=tile_size, preserve_values=preserve_values
+            )
+        except exceptions.TileOutOfBoundsError:
+            return empty_tile_response(tile_size)
+        except exceptions.TileDeadlineExceeded:
+            return unavailable_response()
+        except exceptions.TileReadShedError:
+            # server is busy, fall back to a cached tile of lower zoom
+            tile_data = driver.get_degraded_tile(
+                dataset, tile_xyz, tile_size=tile_size, preserve_values=preserve_values
+            )
+            if tile_data is None:
+                return unavailable_response()
+            admission.count_degraded()
+            degraded = True
+
+        # degraded tiles are never cached, even if empty
+        if not degraded and np.ma.getmaskarray(tile_data).all():
+            return empty_tile_response(tile_size)
+
         out = image.to_uint8(tile_data, *stretch_range)
 
-        return Response(image.array_to_png(out, colormap=colormap))
+        if degraded:
+            return degraded_response(image.array_to_png(out, colormap=colormap))
+
+        return Response(image.cache_png(png_key, image.array_to_png(out, colormap=colormap)))
 
     
     @swagger_auto_schema(
@@ -180,11 +216,29 @@ class Singleband(viewsets.ViewSet):
         if colormap is None:
             colormap = 'gray'
 
+        png_key = image.png_cache_key(
+            [dataset], tile_xyz, colormap=colormap, stretch_ranges=[stretch_range],
+            tile_size=tile_size
+        )
+        png = image.get_cached_png(png_key)
+        if png is not None:
+            return Response(png)
+
         preserve_values = isinstance(colormap, collections.Mapping)
         driver = RasterDriver()
-        tile_data = xyz.get_tile_data(
-           driver, dataset, tile_xyz, tile_size=tile_size, preserve_values=preserve_values
-        )
+        try:
+            tile_data = xyz.get_tile_data(
+               driver, dataset, tile_xyz, tile_size=tile_size, preserve_values=preserve_values,
+               priority=Priority.THUMBNAIL
+            )
+        except exceptions.TileOutOfBoundsError:
+            return empty_tile_response(tile_size)
+        except (exceptions.TileDeadlineExceeded, exceptions.TileReadShedError):
+            return unavailable_response()
+
+        if np.ma.getmaskarray(tile_data).all():
+            return empty_tile_response(tile_size)
+
         out = image.to_uint8(tile_data, *stretch_range)
 
-        return Response(image.array_to_png(out, colormap=colormap))
+        return Response(image.cache_png(png_key, image.array_to_png(out, colormap=colormap)))
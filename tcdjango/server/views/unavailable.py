@@ -0,0 +1,18 @@
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+from typing.io import BinaryIO
+
+
+def unavailable_response() -> Response:
+    """Return 503 for tiles that could not be read in time, asking the client to retry."""
+    return Response(
+        b'', status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': str(settings.RETRY_AFTER), 'Cache-Control': 'no-store'}
+    )
+
+
+def degraded_response(png: BinaryIO) -> Response:
+    """Return a tile scaled up from a lower zoom level, which must not be cached."""
+    return Response(png.getvalue(), headers={'Cache-Control': 'no-store'})